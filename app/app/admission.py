@@ -0,0 +1,245 @@
+import asyncio
+import math
+import re
+from collections import deque
+from collections.abc import Callable
+from enum import IntEnum
+from functools import lru_cache
+from time import perf_counter
+
+from fastapi.responses import ORJSONResponse
+from starlette import status
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metrics import Counter, Gauge, get_metrics_registry
+from app.settings import get_settings
+
+
+class Lane(IntEnum):
+    PRIORITY = 0
+    NORMAL = 1
+
+
+class AdaptiveLimiter:
+    """Concurrency limit following the latency gradient (Gradient2).
+
+    Latencies are averaged over windows of at least ``window`` seconds and ``window_samples``
+    responses. Each window average is compared to a long moving average over ``long_window``
+    windows, the latency the service usually has: it follows a lasting change of the workload
+    within minutes and drops quickly when the load is gone, so no single fast or slow response
+    pins it. While at least half of the limit was in use during the window, the limit moves
+    towards ``limit * gradient + sqrt(limit)`` where the gradient is ``tolerance * long / short``
+    clamped to [0.5, 1]: steady latency lets it grow, rising latency shrinks it. Waiters are
+    served by lane, then in arrival order.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        *,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        max_queue: int,
+        tolerance: float = 2.0,
+        window: float = 1.0,
+        window_samples: int = 10,
+        long_window: int = 600,
+        smoothing: float = 0.2,
+        clock: Callable[[], float] = perf_counter,
+    ) -> None:
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.tolerance = tolerance
+        self.window = window
+        self.window_samples = window_samples
+        self.long_window = long_window
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.queued = 0
+        self.latency = 0.0
+        self.baseline = 0.0
+        self._clock = clock
+        self._windows = 0
+        self._window_start = clock()
+        self._window_latency = 0.0
+        self._window_count = 0
+        self._window_in_flight = 0
+        self._waiters: tuple[deque[asyncio.Future], ...] = tuple(deque() for _ in Lane)
+
+    async def acquire(self, lane: Lane, max_wait: float) -> bool:
+        if self.in_flight < self.limit and not self.queued:
+            self.in_flight += 1
+            return True
+
+        if self.queued >= self.max_queue:
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(future)
+        self.queued += 1
+        try:
+            # unlike wait_for, wait() leaves the future alone on timeout, so a slot handed over late is not lost
+            await asyncio.wait((future,), timeout=max_wait)
+        except asyncio.CancelledError:
+            self._abandon(future)
+            raise
+
+        if future.done():
+            return True
+
+        self._abandon(future)
+        return False
+
+    def hold(self) -> None:
+        """Take a slot without waiting, for work that outlives the request admitted for it."""
+        self.in_flight += 1
+
+    def release(self, latency: float | None) -> None:
+        self.in_flight -= 1
+        if latency is not None:
+            self._update(latency)
+        self._wake()
+
+    def _abandon(self, future: asyncio.Future) -> None:
+        if future.done():
+            # the slot was already handed over
+            self.release(latency=None)
+        else:
+            future.cancel()
+            self.queued -= 1
+
+    def _update(self, latency: float) -> None:
+        self._window_latency += latency
+        self._window_count += 1
+        # the released request counts, it was in flight until now
+        self._window_in_flight = max(self._window_in_flight, self.in_flight + 1)
+        now = self._clock()
+        if self._window_count < self.window_samples or now - self._window_start < self.window:
+            return
+
+        self.latency = self._window_latency / self._window_count
+        in_flight = self._window_in_flight
+        self._window_start, self._window_latency, self._window_count, self._window_in_flight = now, 0.0, 0, 0
+        self._windows += 1
+        # a plain mean until the long window fills up, so the first windows do not count as a full one
+        self.baseline += (self.latency - self.baseline) * max(2 / (self.long_window + 1), 1 / self._windows)
+        if self.baseline > 2 * self.latency:
+            # the load is gone, do not wait a whole long window to believe it
+            self.baseline *= 0.95
+
+        if in_flight < self.limit / 2:
+            # the limit is not what holds the requests back, the latency says nothing about it
+            return
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.baseline / self.latency))
+        target = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit + (target - self.limit) * self.smoothing
+        self.limit = min(float(self.max_limit), max(float(self.min_limit), limit))
+
+    def _wake(self) -> None:
+        while self.in_flight < self.limit:
+            future = self._next_waiter()
+            if future is None:
+                return
+            self.in_flight += 1
+            self.queued -= 1
+            future.set_result(None)
+
+    def _next_waiter(self) -> asyncio.Future | None:
+        for waiters in self._waiters:
+            while waiters:
+                future = waiters.popleft()
+                if not future.done():
+                    return future
+        return None
+
+
+@lru_cache
+def get_request_limiter() -> AdaptiveLimiter:
+    settings = get_settings()
+    return AdaptiveLimiter(
+        initial_limit=settings.LIMITER_INITIAL,
+        min_limit=settings.LIMITER_MIN,
+        max_limit=settings.REQUEST_SEMAPHORE,
+        max_queue=settings.LIMITER_MAX_QUEUE,
+        tolerance=settings.LIMITER_LATENCY_TOLERANCE,
+    )
+
+
+registry = get_metrics_registry()
+requests_shed = registry.register(Counter("http_requests_shed_total", "Requests rejected by the limiter", ("lane",)))
+
+
+def _limiter_stats() -> list[tuple[tuple[str, ...], float]]:
+    limiter = get_request_limiter()
+    return [(("in_flight",), limiter.in_flight), (("queued",), limiter.queued), (("limit",), limiter.limit)]
+
+
+registry.register(Gauge("http_requests_limiter", "Request limiter state", _limiter_stats, ("state",)))
+
+
+class AdmissionMiddleware:
+    """Admit requests through the adaptive limiter, shed the ones that wait past the deadline.
+
+    Paths matching ``bypass`` (health probes, metrics) never wait, paths matching
+    ``priority`` are admitted ahead of the rest.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        app: ASGIApp,
+        *,
+        limiter: AdaptiveLimiter,
+        bypass: str,
+        priority: str,
+        queue_timeout: float,
+        retry_after: int,
+    ) -> None:
+        self.app = app
+        self.limiter = limiter
+        self.bypass = re.compile(bypass)
+        self.priority = re.compile(priority)
+        self.queue_timeout = queue_timeout
+        self.retry_after = str(retry_after)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.bypass.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        lane = Lane.PRIORITY if self.priority.match(scope["path"]) else Lane.NORMAL
+        if not await self.limiter.acquire(lane, max_wait=self.queue_timeout):
+            requests_shed.inc((lane.name.lower(),))
+            response = ORJSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"message": "Service is overloaded, retry later"},
+                headers={"Retry-After": self.retry_after},
+            )
+            await response(scope, receive, send)
+            return
+
+        started = perf_counter()
+        latency = None
+
+        async def send_with_latency(message: Message) -> None:
+            nonlocal latency
+            # time to headers, so long streaming responses do not read as slow ones; errors are
+            # left out, a fast 403 or 404 says nothing about how loaded the service is
+            if message["type"] == "http.response.start" and message["status"] < status.HTTP_400_BAD_REQUEST:
+                latency = perf_counter() - started
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_latency)
+        finally:
+            self.limiter.release(latency)
+
+
+__all__ = [
+    "AdaptiveLimiter",
+    "AdmissionMiddleware",
+    "Lane",
+    "get_request_limiter",
+]
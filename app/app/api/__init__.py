@@ -1,10 +1,14 @@
 from fastapi import APIRouter
 
 from ..settings import get_settings
-from . import organisations, ping
+from . import cache, metrics, organisations, ping
 
 settings = get_settings()
 
 router = APIRouter(prefix=f"/api/{settings.API_VERSION}")
 router.include_router(ping.router)
 router.include_router(organisations.router)
+router.include_router(cache.router)
+
+# scraped at the conventional path, outside of the versioned API
+metrics_router = metrics.router
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Header
+from starlette import status
+
+from app.pg import statement_cache_stats
+from app.service.cache import get_count_cache, get_detail_cache
+
+router = APIRouter(prefix="/cache", tags=["cache"])
+
+
+@router.get("/", status_code=status.HTTP_200_OK, description="In-process cache counters")
+async def cache_stats(_: str = Header(alias="X-AUTH-KEY")) -> dict:
+    return {
+        "organisation_detail": get_detail_cache().stats(),
+        "organisation_count": get_count_cache().stats(),
+        "statements": statement_cache_stats(),
+    }
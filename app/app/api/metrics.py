@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+from starlette import status
+
+from app.metrics import CONTENT_TYPE, get_metrics_registry
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", status_code=status.HTTP_200_OK, description="Prometheus metrics", include_in_schema=False)
+async def metrics() -> Response:
+    return Response(content=get_metrics_registry().render(), media_type=CONTENT_TYPE)
@@ -1,19 +1,30 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Header
+from fastapi import APIRouter, Depends, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from starlette import status
 
-from app.auth import get_api_key
+from app.compression import get_compressor
+from app.etag import etag_matches, not_modified
 from app.models.common import PaginatedResponseModel, PaginatorModel
 from app.models.organisations import (
+    IngestReportModel,
+    OrganisationAutocompleteFilterModel,
+    OrganisationBatchRequestModel,
+    OrganisationBatchResponseModel,
     OrganisationDetailResponseModel,
     OrganisationFilterModel,
+    OrganisationIngestModel,
     OrganisationListResponseModel,
+    OrganisationNearbyFilterModel,
+    OrganisationNearbyResponseModel,
 )
-from app.pg import AsyncSession, get_session
+from app.pg import AsyncSession, get_read_session, get_session
+from app.service.ingest import get_ingest_service, ingest_report, ndjson_lines
 from app.service.organisations import get_organisations_service
+from app.settings import get_settings
 
-router = APIRouter(prefix="/organisations", tags=["organisations"], dependencies=[Depends(get_api_key)])
+router = APIRouter(prefix="/organisations", tags=["organisations"])
 
 
 @router.get(
@@ -25,14 +36,123 @@ router = APIRouter(prefix="/organisations", tags=["organisations"], dependencies
 async def organisations_list(
     data_filter: Annotated[OrganisationFilterModel, Depends()],
     paginator: Annotated[PaginatorModel, Depends()],
-    session: Annotated[AsyncSession, Depends(get_session)],
+    if_none_match: Annotated[str | None, Header()] = None,
+    _: str = Header(alias="X-AUTH-KEY"),
+) -> Response:
+    service = get_organisations_service()
+    # concurrent requests for the same page share one query, the ETag is read with the page and
+    # conditional requests are checked against it, so they are coalesced as well
+    etag, payload = await service.get_list_page_shared(data_filter=data_filter, paginator=paginator)
+    if if_none_match and etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return Response(content=payload, media_type="application/json", headers={"ETag": etag})
+
+
+@router.get(
+    "/export/",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={status.HTTP_200_OK: {"content": {"application/x-ndjson": {}}}},
+    description="Stream all organisations matching the filter as NDJSON, one OrganisationListResponseModel per line",
+)
+async def organisations_export(
+    data_filter: Annotated[OrganisationFilterModel, Depends()],
+    _: str = Header(alias="X-AUTH-KEY"),
+) -> StreamingResponse:
+    settings = get_settings()
+    service = get_organisations_service()
+    return StreamingResponse(
+        service.export_ndjson(data_filter=data_filter, chunk_size=settings.EXPORT_CHUNK_SIZE),
+        # CompressionMiddleware flushes every chunk, so each one still goes out as soon as it is read
+        media_type="application/x-ndjson",
+    )
+
+
+@router.get(
+    "/autocomplete/",
+    status_code=status.HTTP_200_OK,
+    response_model=list[OrganisationListResponseModel],
+    description="Get organisations whose name starts with the prefix, case-insensitive, ordered by name",
+)
+async def organisations_autocomplete(
+    data_filter: Annotated[OrganisationAutocompleteFilterModel, Depends()],
+    session: Annotated[AsyncSession, Depends(get_read_session)],
+    _: str = Header(alias="X-AUTH-KEY"),
+) -> Response:
+    service = get_organisations_service()
+    payload = await service.get_autocomplete_json(session=session, data_filter=data_filter)
+    return Response(content=payload, media_type="application/json")
+
+
+@router.get(
+    "/nearby/",
+    status_code=status.HTTP_200_OK,
+    response_model=list[OrganisationNearbyResponseModel],
+    description="Get organisations within radius metres of a point or the nearest ones, ordered by distance",
+)
+async def organisations_nearby(
+    data_filter: Annotated[OrganisationNearbyFilterModel, Depends()],
+    session: Annotated[AsyncSession, Depends(get_read_session)],
     _: str = Header(alias="X-AUTH-KEY"),
-) -> PaginatedResponseModel[OrganisationListResponseModel]:
+) -> list[OrganisationNearbyResponseModel]:
     service = get_organisations_service()
-    response = await service.get_list(session=session, data_filter=data_filter, paginator=paginator)
+    response = await service.get_nearby(session=session, data_filter=data_filter)
     return response
 
 
+@router.get(
+    "/batch/",
+    status_code=status.HTTP_200_OK,
+    response_model=OrganisationBatchResponseModel,
+    description="Get organisation details by ids",
+)
+async def organisations_batch(
+    ids: Annotated[list[int], Query(min_length=1, max_length=200)],
+    session: Annotated[AsyncSession, Depends(get_session)],
+    _: str = Header(alias="X-AUTH-KEY"),
+) -> Response:
+    service = get_organisations_service()
+    # details are read from the primary, they fill the cache invalidated by its notifications
+    payload = await service.get_detail_batch_json(session=session, organisation_ids=ids)
+    return Response(content=payload, media_type="application/json")
+
+
+@router.post(
+    "/batch/",
+    status_code=status.HTTP_200_OK,
+    response_model=OrganisationBatchResponseModel,
+    description="Get organisation details by ids",
+)
+async def organisations_batch_post(
+    data: OrganisationBatchRequestModel,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    _: str = Header(alias="X-AUTH-KEY"),
+) -> Response:
+    service = get_organisations_service()
+    payload = await service.get_detail_batch_json(session=session, organisation_ids=data.ids)
+    return Response(content=payload, media_type="application/json")
+
+
+@router.post(
+    "/ingest/",
+    status_code=status.HTTP_200_OK,
+    response_model=IngestReportModel,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/x-ndjson": {"schema": OrganisationIngestModel.model_json_schema()}},
+        }
+    },
+    description="Insert, update or delete organisations from NDJSON, one OrganisationIngestModel per line. "
+    "Lines are applied in batches, each in its own transaction",
+)
+async def organisations_ingest(request: Request, _: str = Header(alias="X-AUTH-KEY")) -> IngestReportModel:
+    service = get_ingest_service()
+    async with service.slot():
+        batches = [batch async for batch in service.ingest_lines(ndjson_lines(request.stream()))]
+    return ingest_report(batches)
+
+
 @router.get(
     "/{organisation_id}/",
     status_code=status.HTTP_200_OK,
@@ -42,8 +162,18 @@ async def organisations_list(
 async def organisations_detail(
     organisation_id: int,
     session: Annotated[AsyncSession, Depends(get_session)],
+    if_none_match: Annotated[str | None, Header()] = None,
+    accept_encoding: Annotated[str | None, Header()] = None,
     _: str = Header(alias="X-AUTH-KEY"),
-) -> OrganisationDetailResponseModel:
+) -> Response:
     service = get_organisations_service()
-    response = await service.get_detail(session=session, organisation_id=organisation_id)
-    return response
+    if if_none_match:
+        etag = await service.get_detail_etag(session=session, organisation_id=organisation_id)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+    etag, body = await service.get_detail_json_shared(organisation_id=organisation_id)
+    # a repeat hit sends the variant encoded by the first one
+    return await get_compressor().response(
+        body, accept_encoding=accept_encoding, headers={"ETag": etag}, media_type="application/json"
+    )
@@ -1,9 +1,30 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 from starlette import status
 
+from app.health import get_readiness
+
 router = APIRouter(prefix="/ping", tags=["ping"])
 
 
-@router.get("/", status_code=status.HTTP_200_OK, description="Readiness, liveness probes")
+@router.get("/", status_code=status.HTTP_200_OK, description="Liveness probe, same as /ping/live/")
 async def ping() -> dict:
     return {"success": True}
+
+
+@router.get("/live/", status_code=status.HTTP_200_OK, description="Liveness probe, the worker serves requests")
+async def live() -> dict:
+    return {"success": True}
+
+
+@router.get(
+    "/ready/",
+    status_code=status.HTTP_200_OK,
+    description="Readiness probe: the pools are warm, the database answers and the pools are not saturated, "
+    "503 otherwise",
+    responses={status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "Not ready"}},
+)
+async def ready(response: Response) -> dict:
+    checks = await get_readiness().check()
+    if not checks["success"]:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return checks
@@ -1,24 +1,67 @@
+import hmac
+import re
 from functools import lru_cache
 
-from fastapi import HTTPException, Security, status
-from fastapi.security import APIKeyHeader
+from fastapi.responses import ORJSONResponse
+from starlette import status
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from app.settings import get_settings
 
+API_KEY_HEADER = b"x-auth-key"
+
 
 @lru_cache
-def get_api_header() -> APIKeyHeader:
-    return APIKeyHeader(name="X-AUTH-KEY", auto_error=True)
+def get_api_keys() -> tuple[bytes, ...]:
+    settings = get_settings()
+    return tuple({key.encode() for key in (settings.API_AUTH_KEY, *settings.API_AUTH_KEYS) if key})
 
 
-async def get_api_key(
-    api_key: str = Security(get_api_header()),
-) -> str:
-    settings = get_settings()
-    if api_key == settings.API_AUTH_KEY:
-        return api_key
+@lru_cache
+def get_write_keys() -> tuple[bytes, ...]:
+    """Keys of the endpoints that change data, none of the read keys is one."""
+    return tuple({key.encode() for key in get_settings().API_WRITE_KEYS if key})
+
+
+def is_valid_api_key(candidate: bytes, keys: tuple[bytes, ...]) -> bool:
+    # every key is compared, so the timing does not tell which key is closest
+    valid = False
+    for key in keys:
+        valid |= hmac.compare_digest(candidate, key)
+    return valid
+
+
+class AuthMiddleware:
+    """Reject requests to ``protected`` paths without a valid X-AUTH-KEY header.
+
+    Paths matching ``write`` take only the write keys, the rest of ``protected`` the read keys.
+    OPTIONS requests pass through, CORS preflight requests carry no key.
+    """
+
+    def __init__(self, app: ASGIApp, protected: str, write: str) -> None:
+        self.app = app
+        self.protected = re.compile(protected)
+        self.write = re.compile(write)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or not self.protected.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        keys = get_write_keys() if self.write.match(scope["path"]) else get_api_keys()
+        api_key = next((value for name, value in scope["headers"] if name == API_KEY_HEADER), None)
+        if api_key is not None and is_valid_api_key(api_key, keys):
+            await self.app(scope, receive, send)
+            return
+
+        response = ORJSONResponse(
+            status_code=status.HTTP_403_FORBIDDEN,
+            content={"detail": "Could not validate credentials"},
+        )
+        await response(scope, receive, send)
+
 
-    raise HTTPException(
-        status_code=status.HTTP_403_FORBIDDEN,
-        detail="Could not validate credentials",
-    )
+__all__ = [
+    "AuthMiddleware",
+    "is_valid_api_key",
+]
@@ -0,0 +1,256 @@
+import asyncio
+import gzip
+import zlib
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from typing import Protocol
+
+from fastapi import Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.etag import weak_etag
+from app.settings import get_settings
+
+try:
+    import zstandard
+except ImportError:  # optional, zstd is not offered without it
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # optional, br is not offered without it
+    brotli = None
+
+EXCLUDED_CONTENT_TYPES = ("text/event-stream",)
+
+
+class Encoder(Protocol):
+    def encode(self, chunk: bytes, *, final: bool) -> bytes: ...
+
+
+class GzipEncoder:
+    def __init__(self, level: int) -> None:
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def encode(self, chunk: bytes, *, final: bool) -> bytes:
+        # every chunk is flushed, so a slow stream is not held back waiting for a full block
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class ZstdEncoder:
+    def __init__(self, level: int) -> None:
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def encode(self, chunk: bytes, *, final: bool) -> bytes:
+        flush = zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        return self._compressor.compress(chunk) + self._compressor.flush(flush)
+
+
+class BrotliEncoder:
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def encode(self, chunk: bytes, *, final: bool) -> bytes:
+        return self._compressor.process(chunk) + (self._compressor.finish() if final else self._compressor.flush())
+
+
+def _zstd_compress(body: bytes, level: int) -> bytes:
+    # compression contexts are not thread safe, one per call
+    return zstandard.ZstdCompressor(level=level).compress(body)
+
+
+@dataclass(frozen=True, slots=True)
+class Codec:
+    name: str
+    compress: Callable[[bytes], bytes]
+    encoder: Callable[[], Encoder]
+
+
+def available_codecs(gzip_level: int, zstd_level: int, brotli_quality: int) -> list[Codec]:
+    """Codecs in order of preference, zstd and br only when their package is installed."""
+    codecs = []
+    if zstandard is not None:
+        codecs.append(Codec("zstd", partial(_zstd_compress, level=zstd_level), partial(ZstdEncoder, zstd_level)))
+    if brotli is not None:
+        codecs.append(
+            Codec("br", partial(brotli.compress, quality=brotli_quality), partial(BrotliEncoder, brotli_quality))
+        )
+    codecs.append(
+        Codec("gzip", partial(gzip.compress, compresslevel=gzip_level, mtime=0), partial(GzipEncoder, gzip_level))
+    )
+    return codecs
+
+
+@dataclass(slots=True, eq=False)
+class CachedBody:
+    """Serialized response body and the encoded variants already built from it."""
+
+    content: bytes
+    encoded: dict[str, bytes] = field(default_factory=dict)
+
+
+class Compressor:
+    """Picks the codec for a request and compresses bodies with it.
+
+    Bodies of at least ``offload_size`` bytes are compressed in a thread pool, zlib, zstd and
+    brotli release the GIL, so the event loop keeps serving other requests meanwhile.
+    """
+
+    def __init__(self, *, codecs: list[Codec], minimum_size: int, offload_size: int, threads: int) -> None:
+        self.codecs = codecs
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="compression")
+
+    def negotiate(self, accept_encoding: str | None) -> Codec | None:
+        """The codec with the highest q-value in ``Accept-Encoding``, ties go to the server preference."""
+        if not accept_encoding:
+            return None
+
+        weights = {}
+        for item in accept_encoding.split(","):
+            coding, _, params = item.partition(";")
+            weight = 1.0
+            for param in params.split(";"):
+                key, _, value = param.strip().partition("=")
+                if key.lower() == "q":
+                    try:
+                        weight = float(value)
+                    except ValueError:
+                        weight = 0.0
+            weights[coding.strip().lower()] = weight
+
+        default = weights.get("*", 0.0)
+        best, best_weight = None, 0.0
+        for codec in self.codecs:
+            weight = weights.get(codec.name, default)
+            if weight > best_weight:
+                best, best_weight = codec, weight
+        return best
+
+    async def compress(self, body: bytes, codec: Codec) -> bytes:
+        if len(body) < self.offload_size:
+            return codec.compress(body)
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, codec.compress, body)
+
+    async def response(
+        self, body: CachedBody, accept_encoding: str | None, headers: dict[str, str], media_type: str
+    ) -> Response:
+        """Response for a cached body, the encoded variant is built once and kept in ``body``."""
+        headers = {**headers, "Vary": "Accept-Encoding"}
+        codec = self.negotiate(accept_encoding) if len(body.content) >= self.minimum_size else None
+        if codec is None:
+            return Response(content=body.content, media_type=media_type, headers=headers)
+
+        content = body.encoded.get(codec.name)
+        if content is None:
+            content = body.encoded[codec.name] = await self.compress(body.content, codec)
+        headers["Content-Encoding"] = codec.name
+        if "ETag" in headers:
+            headers["ETag"] = weak_etag(headers["ETag"])
+        return Response(content=content, media_type=media_type, headers=headers)
+
+
+class CompressionMiddleware:
+    """Compress responses with the codec negotiated from ``Accept-Encoding``.
+
+    Responses that already carry ``Content-Encoding`` pass through untouched, that covers
+    bodies encoded ahead from a cache and streams marked ``identity`` to go out unbuffered.
+    Streams are compressed chunk by chunk, single bodies at once.
+    """
+
+    def __init__(self, app: ASGIApp, *, compressor: Compressor) -> None:
+        self.app = app
+        self.compressor = compressor
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        codec = self.compressor.negotiate(Headers(scope=scope).get("accept-encoding"))
+        start: Message = {}
+        passthrough = False
+        encoder: Encoder | None = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, passthrough, encoder
+            if message["type"] == "http.response.start":
+                # held back until the first body shows whether and how the headers change
+                start = message
+                headers = Headers(raw=message["headers"])
+                passthrough = "content-encoding" in headers or headers.get("content-type", "").startswith(
+                    EXCLUDED_CONTENT_TYPES
+                )
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                if start:
+                    await send(start)
+                    start = {}
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if not start:
+                # later chunks of a stream
+                if encoder is not None:
+                    message["body"] = encoder.encode(body, final=not more_body)
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            if more_body or len(body) >= self.compressor.minimum_size:
+                if "accept-encoding" not in headers.get("vary", "").lower():
+                    headers.add_vary_header("Accept-Encoding")
+                if codec is not None and more_body:
+                    encoder = codec.encoder()
+                    message["body"] = encoder.encode(body, final=False)
+                    self._encoded(headers, codec)
+                    del headers["Content-Length"]
+                elif codec is not None:
+                    message["body"] = await self.compressor.compress(body, codec)
+                    self._encoded(headers, codec)
+                    headers["Content-Length"] = str(len(message["body"]))
+
+            await send(start)
+            start = {}
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def _encoded(headers: MutableHeaders, codec: Codec) -> None:
+        headers["Content-Encoding"] = codec.name
+        if "etag" in headers:
+            headers["ETag"] = weak_etag(headers["etag"])
+
+
+@lru_cache
+def get_compressor() -> Compressor:
+    settings = get_settings()
+    return Compressor(
+        codecs=available_codecs(
+            gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+            zstd_level=settings.COMPRESSION_ZSTD_LEVEL,
+            brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+        ),
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        offload_size=settings.COMPRESSION_OFFLOAD_SIZE,
+        threads=settings.COMPRESSION_THREADS,
+    )
+
+
+__all__ = [
+    "CachedBody",
+    "Codec",
+    "CompressionMiddleware",
+    "Compressor",
+    "available_codecs",
+    "get_compressor",
+]
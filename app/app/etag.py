@@ -0,0 +1,40 @@
+from hashlib import blake2b
+
+from fastapi import Response
+from starlette import status
+
+# part of every ETag, bump it when the serialized representation changes so old tags stop matching
+REPRESENTATION_VERSION = 1
+
+
+def make_etag(*parts: object) -> str:
+    digest = blake2b(repr((REPRESENTATION_VERSION, *parts)).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison of ``If-None-Match`` against ``etag``, as required for GET."""
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def weak_etag(etag: str) -> str:
+    """The validator of an encoded variant, its bytes differ from the identity ones."""
+    return etag if etag.startswith("W/") else f"W/{etag}"
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+__all__ = [
+    "etag_matches",
+    "make_etag",
+    "not_modified",
+    "weak_etag",
+]
@@ -13,3 +13,6 @@ class OrganisationNotFoundError(DBNotFoundError): ...
 class CustomValidationError(BaseAppError):
     def __init__(self, msg: str) -> None:
         self.msg = msg
+
+
+class IngestBusyError(BaseAppError): ...
@@ -2,7 +2,8 @@ from fastapi import FastAPI, Request, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import ORJSONResponse
 
-from app.exceptions import CustomValidationError, DBNotFoundError
+from app.exceptions import CustomValidationError, DBNotFoundError, IngestBusyError
+from app.settings import get_settings
 
 
 def setup_handlers(app: FastAPI) -> FastAPI:
@@ -32,4 +33,12 @@ def setup_handlers(app: FastAPI) -> FastAPI:
             content={"message": exc.msg},
         )
 
+    @app.exception_handler(IngestBusyError)
+    async def ingest_busy_handler(request: Request, exc: IngestBusyError) -> ORJSONResponse:  # noqa: ARG001
+        return ORJSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"message": "Too many ingestions in progress, retry later"},
+            headers={"Retry-After": str(get_settings().LIMITER_RETRY_AFTER)},
+        )
+
     return app
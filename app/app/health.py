@@ -0,0 +1,99 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from functools import lru_cache
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.pg import ReadRouter, get_pg_engine, get_read_router
+from app.settings import get_settings
+from app.warmup import warmup
+
+PING_QUERY = text("SELECT 1")
+
+
+class Readiness:
+    """Whether the worker should get traffic.
+
+    Ready once the startup warmup has completed, while the primary answers within ``timeout``
+    and less than ``max_pool_usage`` of the busiest pool in use is checked out. A probe that
+    finds the database reachable after a failed warmup retries it in the background.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        engine: AsyncEngine,
+        *,
+        router: ReadRouter,
+        capacity: int,
+        timeout: float,
+        max_pool_usage: float,
+        warm_up: Callable[[], Awaitable[bool]],
+    ) -> None:
+        self.engine = engine
+        self.router = router
+        self.capacity = capacity
+        self.timeout = timeout
+        self.max_pool_usage = max_pool_usage
+        self.warm = False
+        self._warm_up = warm_up
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    async def warm_up(self) -> bool:
+        async with self._lock:
+            if not self.warm:
+                self.warm = await self._warm_up()
+        return self.warm
+
+    def pool_usage(self) -> float:
+        engines = [self.engine, *(replica.engine for replica in self.router.replicas if replica.healthy)]
+        return max(engine.pool.checkedout() for engine in engines) / max(self.capacity, 1)
+
+    async def _database_reachable(self) -> bool:
+        try:
+            async with asyncio.timeout(self.timeout), self.engine.connect() as connection:
+                await connection.execute(PING_QUERY)
+        except (OSError, SQLAlchemyError, TimeoutError):
+            return False
+        return True
+
+    async def check(self) -> dict:
+        pool_usage = self.pool_usage()
+        saturated = pool_usage >= self.max_pool_usage
+        # a probe on a saturated pool would queue behind the requests, busy connections answer for the database
+        reachable = saturated or await self._database_reachable()
+        if reachable and not self.warm and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self.warm_up())
+        return {
+            "success": self.warm and reachable and not saturated,
+            "warm": self.warm,
+            "database": reachable,
+            "pool_usage": round(pool_usage, 4),
+        }
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+@lru_cache
+def get_readiness() -> Readiness:
+    settings = get_settings()
+    return Readiness(
+        engine=get_pg_engine(),
+        router=get_read_router(),
+        capacity=settings.PG.POOL_MINSIZE + settings.PG.POOL_MAX_OVERFLOW,
+        timeout=settings.READY_TIMEOUT,
+        max_pool_usage=settings.READY_MAX_POOL_USAGE,
+        warm_up=warmup,
+    )
+
+
+__all__ = [
+    "Readiness",
+    "get_readiness",
+]
@@ -0,0 +1,62 @@
+"""Bulk organisation ingestion from NDJSON, one OrganisationIngestModel per line.
+
+    python -m app.ingest organisations.ndjson
+    registry-export | python -m app.ingest -
+
+Prints a JSON report per batch and a summary at the end.
+"""
+
+import argparse
+import asyncio
+import sys
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import BinaryIO
+
+import orjson
+
+from app.exceptions import CustomValidationError
+from app.pg import get_pg_engine
+from app.service.ingest import OrganisationIngestService, ingest_report
+from app.settings import get_settings
+
+
+async def _lines(source: BinaryIO) -> AsyncIterator[bytes]:
+    for line in source:
+        yield line
+
+
+async def run(args: argparse.Namespace) -> int:
+    service = OrganisationIngestService(
+        engine=get_pg_engine(), batch_size=args.batch_size or get_settings().INGEST_BATCH_SIZE, concurrency=1
+    )
+    batches = []
+    source = sys.stdin.buffer if args.path == "-" else Path(args.path).open("rb")  # noqa: ASYNC230, SIM115
+    try:
+        async for batch in service.ingest_lines(_lines(source)):
+            batches.append(batch)
+            sys.stdout.buffer.write(orjson.dumps(batch.model_dump(mode="json")) + b"\n")
+            sys.stdout.flush()
+    except CustomValidationError as e:
+        sys.stderr.write(f"{e.msg}\n")
+        return 1
+    finally:
+        source.close()
+        await get_pg_engine().dispose()
+
+    report = ingest_report(batches).model_dump(mode="json", exclude={"batches"})
+    sys.stdout.buffer.write(orjson.dumps(report) + b"\n")
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="NDJSON file, - for stdin")
+    parser.add_argument(
+        "--batch-size", type=int, help="Organisations per transaction, APP_INGEST_BATCH_SIZE if not set"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
@@ -3,10 +3,51 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
-from app.pg import get_pg_engine
+from app.health import get_readiness
+from app.listener import get_pg_listener
+from app.metrics import get_loop_lag_monitor
+from app.pg import get_pg_engine, get_read_router
+from app.service.activities import ACTIVITY_CHANNEL, get_activity_tree
+from app.service.cache import get_catalogue_version, get_count_cache, get_detail_cache
+from app.service.geo import get_building_index
+from app.service.organisations import ORGANISATION_CHANNEL
+from app.settings import get_settings
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:  # noqa: ARG001
+    settings = get_settings()
     get_pg_engine()
+    loop_lag_monitor = get_loop_lag_monitor()
+    loop_lag_monitor.start()
+    listener = get_pg_listener()
+    detail_cache = get_detail_cache()
+    count_cache = get_count_cache()
+    catalogue_version = get_catalogue_version()
+    building_index = get_building_index()
+    activity_tree = get_activity_tree()
+    listener.subscribe(ACTIVITY_CHANNEL, activity_tree.schedule_reload)
+    listener.subscribe(ORGANISATION_CHANNEL, detail_cache.invalidate)
+    listener.subscribe(ORGANISATION_CHANNEL, building_index.on_change)
+    listener.subscribe(ORGANISATION_CHANNEL, activity_tree.on_organisation_change)
+    # any change may move any count, a burst of notifications clears the counts once
+    listener.subscribe(ORGANISATION_CHANNEL, lambda _: count_cache.schedule_clear(settings.COUNT_CACHE_CLEAR_DELAY))
+    listener.subscribe(ORGANISATION_CHANNEL, catalogue_version.bump)
+    listener.on_reconnect(detail_cache.clear)
+    listener.on_reconnect(count_cache.clear)
+    listener.on_reconnect(catalogue_version.bump)
+    listener.on_reconnect(building_index.schedule_reload)
+    listener.on_reconnect(activity_tree.schedule_reload)
+    read_router = get_read_router()
+    await read_router.start()
+    await listener.start()
+    await building_index.reload()
+    await activity_tree.reload()
+    # the worker reports ready once its pools are open and the hot statements prepared
+    readiness = get_readiness()
+    await readiness.warm_up()
     yield
+    await readiness.stop()
+    await listener.stop()
+    await read_router.stop()
+    await loop_lag_monitor.stop()
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from collections import defaultdict
+from collections.abc import Callable
+from functools import lru_cache
+
+import asyncpg
+
+from app.settings import PGSettings, get_settings
+
+logger = logging.getLogger(__name__)
+
+type NotifyHandler = Callable[[str], None]
+type ReconnectHandler = Callable[[], None]
+
+
+class PGListener:
+    """Dedicated LISTEN connection dispatching NOTIFY payloads to in-process subscribers.
+
+    Notifications sent while the connection is down are lost, so reconnect handlers
+    are called after every reconnect to let subscribers resync their state.
+    """
+
+    def __init__(self, pg_settings: PGSettings) -> None:
+        self._pg_settings = pg_settings
+        self._handlers: dict[str, list[NotifyHandler]] = defaultdict(list)
+        self._reconnect_handlers: list[ReconnectHandler] = []
+        self._connection: asyncpg.Connection | None = None
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, channel: str, handler: NotifyHandler) -> None:
+        self._handlers[channel].append(handler)
+
+    def on_reconnect(self, handler: ReconnectHandler) -> None:
+        self._reconnect_handlers.append(handler)
+
+    @property
+    def connected(self) -> bool:
+        return self._connection is not None and not self._connection.is_closed()
+
+    async def start(self) -> None:
+        await self._connect()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._close()
+
+    async def _connect(self) -> None:
+        self._connection = await asyncpg.connect(self._pg_settings.dsn)
+        for channel in self._handlers:
+            await self._connection.add_listener(channel, self._dispatch)
+
+    async def _close(self) -> None:
+        if self._connection is not None:
+            await self._connection.close(timeout=1)
+            self._connection = None
+
+    async def _wait_closed(self) -> None:
+        closed = asyncio.Event()
+        self._connection.add_termination_listener(lambda _: closed.set())
+        await closed.wait()
+
+    async def _run(self) -> None:
+        while True:
+            if self.connected:
+                await self._wait_closed()
+                logger.warning("PG listener connection lost, reconnecting")
+            await self._close()
+            await asyncio.sleep(self._pg_settings.LISTENER_RECONNECT_DELAY)
+            try:
+                await self._connect()
+            except (OSError, asyncpg.PostgresError):
+                logger.exception("PG listener reconnect failed")
+                continue
+
+            for handler in self._reconnect_handlers:
+                handler()
+
+    def _dispatch(self, connection: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:  # noqa: ARG002
+        for handler in self._handlers[channel]:
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception("PG listener handler failed on channel %s", channel)
+
+
+@lru_cache
+def get_pg_listener() -> PGListener:
+    settings = get_settings()
+    return PGListener(pg_settings=settings.PG)
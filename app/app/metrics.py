@@ -0,0 +1,217 @@
+import asyncio
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from functools import lru_cache
+from time import perf_counter
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.settings import get_settings
+
+type Labels = tuple[str, ...]
+type Sample = tuple[Labels, float]
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "unmatched"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names: Labels, values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Labels = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), value: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def value(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self, extra: str = "") -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labels, labels, extra)} {value}"
+
+
+class Histogram:
+    def __init__(
+        self, name: str, documentation: str, labels: Labels = (), buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # per label set: counts of every bucket plus +Inf, not cumulative, and the sum in the last slot
+        self._values: dict[Labels, list[float]] = {}
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        values = self._values.get(labels)
+        if values is None:
+            values = self._values[labels] = [0] * (len(self.buckets) + 2)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def render(self, extra: str = "") -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, values in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), values, strict=False):
+                cumulative += count
+                bucket = ",".join(filter(None, (extra, f'le="{bound}"')))
+                yield f"{self.name}_bucket{_format_labels(self.labels, labels, bucket)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, labels, extra)} {values[-1]}"
+            yield f"{self.name}_count{_format_labels(self.labels, labels, extra)} {cumulative}"
+
+
+class Gauge:
+    """Metric read from a callback at scrape time, so nothing is paid for it on the request path."""
+
+    type = "gauge"
+
+    def __init__(
+        self, name: str, documentation: str, collect: Callable[[], Iterable[Sample]], labels: Labels = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.collect = collect
+
+    def render(self, extra: str = "") -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        for labels, value in self.collect():
+            yield f"{self.name}{_format_labels(self.labels, labels, extra)} {value}"
+
+
+class CollectedCounter(Gauge):
+    """Monotonic counter kept elsewhere and read at scrape time."""
+
+    type = "counter"
+
+
+type Metric = Counter | Histogram | Gauge
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+        self._labels = ""
+
+    def set_labels(self, **labels: str) -> None:
+        """Labels added to every sample, such as the worker of a multi-process server."""
+        self._labels = _format_labels(tuple(labels), tuple(labels.values()))[1:-1]
+
+    def register[T: Metric](self, metric: T) -> T:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics.values() for line in metric.render(self._labels)) + "\n"
+
+
+@lru_cache
+def get_metrics_registry() -> MetricsRegistry:
+    return MetricsRegistry()
+
+
+registry = get_metrics_registry()
+http_requests = registry.register(
+    Counter("http_requests_total", "HTTP responses by route and status", labels=("method", "route", "status"))
+)
+http_latency = registry.register(
+    Histogram("http_request_duration_seconds", "HTTP request latency", labels=("method", "route"))
+)
+db_pool_wait = registry.register(Histogram("db_pool_wait_seconds", "Time spent waiting for a pool connection"))
+loop_lag = registry.register(Histogram("event_loop_lag_seconds", "Event loop scheduling delay"))
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # the router stores the matched route in the shared scope, its template keeps label cardinality bounded
+            route = scope.get("route")
+            labels = (scope["method"], route.path if route is not None else UNMATCHED_ROUTE)
+            http_latency.observe(perf_counter() - started, labels)
+            http_requests.inc((*labels, str(status_code)))
+
+
+class LoopLagMonitor:
+    """Measure how late a periodic sleep wakes up, which is how long callbacks wait for the loop."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.last_lag = 0.0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = perf_counter()
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(0.0, perf_counter() - started - self.interval)
+            loop_lag.observe(self.last_lag)
+
+
+@lru_cache
+def get_loop_lag_monitor() -> LoopLagMonitor:
+    settings = get_settings()
+    return LoopLagMonitor(interval=settings.LOOP_LAG_INTERVAL)
+
+
+registry.register(
+    Gauge(
+        "event_loop_lag_last_seconds",
+        "Event loop delay of the last measurement",
+        lambda: [((), get_loop_lag_monitor().last_lag)],
+    )
+)
+
+
+__all__ = [
+    "CONTENT_TYPE",
+    "CollectedCounter",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsMiddleware",
+    "db_pool_wait",
+    "get_loop_lag_monitor",
+    "get_metrics_registry",
+]
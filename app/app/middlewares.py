@@ -1,21 +1,34 @@
-from asyncio import Semaphore
-from collections.abc import Callable
-from functools import lru_cache
-
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
 
+from app.admission import AdmissionMiddleware, get_request_limiter
+from app.auth import AuthMiddleware
+from app.compression import CompressionMiddleware, get_compressor
+from app.metrics import MetricsMiddleware
+from app.request_stats import RequestStatsMiddleware
 from app.settings import get_settings
 
 
-@lru_cache
-def get_semaphore() -> Semaphore:
+def setup_middlewares(app: FastAPI) -> FastAPI:
     settings = get_settings()
-    return Semaphore(value=settings.REQUEST_SEMAPHORE)
-
+    api_prefix = f"/api/{settings.API_VERSION}"
 
-def setup_middlewares(app: FastAPI) -> FastAPI:
+    app.add_middleware(
+        AdmissionMiddleware,
+        limiter=get_request_limiter(),
+        # an ingestion request runs for seconds, its latency would read as overload; APP_INGEST_CONCURRENCY caps them
+        bypass=rf"^(/metrics$|{api_prefix}/ping/|{api_prefix}/organisations/ingest/)",
+        priority=rf"^({api_prefix}/organisations/\d+/$|{api_prefix}/cache/)",
+        queue_timeout=settings.LIMITER_QUEUE_TIMEOUT,
+        retry_after=settings.LIMITER_RETRY_AFTER,
+    )
+    # outside the limiter, so requests without a key never take or wait for a slot
+    app.add_middleware(
+        AuthMiddleware,
+        protected=rf"^{api_prefix}/(organisations|cache)/",
+        write=rf"^{api_prefix}/organisations/ingest/",
+    )
+    # answers preflight requests itself and adds its headers to 403 responses as well
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -23,14 +36,9 @@ def setup_middlewares(app: FastAPI) -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
-
-    @app.middleware("http")
-    async def semaphores(request: Request, call_next: Callable) -> Response:
-        sem = get_semaphore()
-        async with sem:
-            response = await call_next(request)
-        return response
-
-    app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
+    app.add_middleware(CompressionMiddleware, compressor=get_compressor())
+    app.add_middleware(RequestStatsMiddleware)
+    # outermost, so the latency includes the time spent queued in the limiter
+    app.add_middleware(MetricsMiddleware)
 
     return app
@@ -1,4 +1,4 @@
-from sqlmodel import BigInteger, Field, SQLModel
+from sqlmodel import BigInteger, Field, Index, SQLModel
 
 
 class ActivityModel(SQLModel, table=True):
@@ -9,6 +9,19 @@ class ActivityModel(SQLModel, table=True):
     parent_id: int | None = Field(foreign_key="activity.id", sa_type=BigInteger)
 
 
+class ActivityClosureModel(SQLModel, table=True):
+    """Every (ancestor, descendant) pair of the activity tree, maintained by triggers on activity."""
+
+    __tablename__ = "activity_closure"
+
+    ancestor_id: int = Field(primary_key=True, foreign_key="activity.id", ondelete="CASCADE", sa_type=BigInteger)
+    descendant_id: int = Field(primary_key=True, foreign_key="activity.id", ondelete="CASCADE", sa_type=BigInteger)
+    depth: int
+
+    __table_args__ = (Index("idx_activity_closure_descendant", "descendant_id", "ancestor_id"),)
+
+
 __all__ = [
     "ActivityModel",
+    "ActivityClosureModel",
 ]
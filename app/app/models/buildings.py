@@ -1,6 +1,7 @@
+from datetime import datetime
 from decimal import Decimal
 
-from sqlmodel import BigInteger, Field, Index, Relationship, SQLModel
+from sqlmodel import BigInteger, DateTime, Field, Index, Relationship, SQLModel, text
 
 
 class CityModel(SQLModel, table=True):
@@ -8,6 +9,11 @@ class CityModel(SQLModel, table=True):
 
     id: int = Field(primary_key=True, sa_type=BigInteger, sa_column_kwargs={"autoincrement": True})
     name: str = Field(max_length=256)
+    updated_at: datetime | None = Field(
+        default=None,
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": text("now()"), "nullable": False},
+    )
     streets: list["StreetModel"] = Relationship(back_populates="city")
 
 
@@ -17,6 +23,11 @@ class StreetModel(SQLModel, table=True):
     id: int = Field(primary_key=True, sa_type=BigInteger, sa_column_kwargs={"autoincrement": True})
     name: str = Field(max_length=256)
     city_id: int = Field(foreign_key="city.id", sa_type=BigInteger)
+    updated_at: datetime | None = Field(
+        default=None,
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": text("now()"), "nullable": False},
+    )
     city: "CityModel" = Relationship(back_populates="streets")
     buildings: list["BuildingModel"] = Relationship(back_populates="street")
 
@@ -29,6 +40,11 @@ class BuildingModel(SQLModel, table=True):
     street_id: int = Field(foreign_key="street.id", sa_type=BigInteger)
     latitude: Decimal = Field(ge=-90, le=90)
     longitude: Decimal = Field(ge=-180, le=180)
+    updated_at: datetime | None = Field(
+        default=None,
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": text("now()"), "nullable": False},
+    )
     street: "StreetModel" = Relationship(back_populates="buildings")
     addresses: list["OrganisationAddressModel"] = Relationship(back_populates="building")  # noqa: F821
 
@@ -1,10 +1,57 @@
-from pydantic import BaseModel, Field
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from enum import StrEnum
+from typing import Self
+
+import orjson
+from pydantic import BaseModel, Field, ValidationError
+
+from app.exceptions import CustomValidationError
+
+
+class CountMode(StrEnum):
+    NONE = "none"
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    AUTO = "auto"
 
 
 class PaginatorModel(BaseModel):
     page: int = Field(1, ge=1, description="Page number")
     size: int = Field(10, ge=1, le=500, description="Count objects per page")
+    cursor: str | None = Field(None, description="Opaque cursor from next_cursor/prev_cursor, page is ignored if set")
+    count: CountMode = Field(
+        CountMode.NONE,
+        description="How to compute total: exact count, planner estimate, or auto (exact for small results)",
+    )
 
 
 class PaginatedResponseModel[T](PaginatorModel):
     items: list[T]
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
+    has_more: bool = Field(False, description="Whether there are objects after this page")
+    total: int | None = Field(None, description="Count of all matching objects, set unless count is none")
+    total_estimated: bool | None = Field(None, description="Whether total is a planner estimate")
+
+
+class CursorDirection(StrEnum):
+    NEXT = "next"
+    PREV = "prev"
+
+
+class CursorModel(BaseModel):
+    direction: CursorDirection
+    name: str
+    id: int
+
+    def encode(self) -> str:
+        raw = orjson.dumps([self.direction, self.name, self.id])
+        return urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+    @classmethod
+    def decode(cls, cursor: str) -> Self:
+        try:
+            direction, name, _id = orjson.loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            return cls(direction=direction, name=name, id=_id)
+        except (ValueError, TypeError, ValidationError) as e:
+            raise CustomValidationError(msg="cursor is invalid.") from e
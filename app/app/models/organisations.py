@@ -1,9 +1,12 @@
+from datetime import datetime
 from decimal import Decimal
 from enum import StrEnum
-from typing import Self
+from typing import Annotated, Self
 
 from pydantic import BaseModel, model_validator
-from sqlmodel import BigInteger, Field, Index, Relationship, SQLModel, text
+from pydantic import Field as PydanticField
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlmodel import BigInteger, DateTime, Field, Index, Relationship, SQLModel, text
 
 from app.exceptions import CustomValidationError
 
@@ -51,6 +54,11 @@ class OrganisationTypes(StrEnum):
     IP = "IP"
 
 
+class OrganisationSearchMode(StrEnum):
+    SUBSTRING = "substring"
+    FUZZY = "fuzzy"
+
+
 class OrganisationModel(SQLModel, table=True):
     __tablename__ = "organisation"
 
@@ -58,28 +66,69 @@ class OrganisationModel(SQLModel, table=True):
     type: OrganisationTypes = Field(max_length=3, sa_column_kwargs={"nullable": False})
     name: str = Field(max_length=256)
     address_id: int = Field(foreign_key="organisation_address.id", sa_type=BigInteger)
+    # row version, bumped by touch_updated_at() and by changes of the phones and activities
+    updated_at: datetime | None = Field(
+        default=None,
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": text("now()"), "nullable": False},
+    )
     phones: list["PhoneModel"] = Relationship(back_populates="organisation")
     activities: list["OrganisationActivityModel"] = Relationship(back_populates="organisation")
     address: "OrganisationAddressModel" = Relationship(back_populates="organisations")
 
+    __table_args__ = (Index("idx_org_address", "address_id"),)
+
+
+class OrganisationSearchModel(SQLModel, table=True):
+    """Denormalized organisation list filters, maintained by the organisation_search_changed() triggers."""
+
+    __tablename__ = "organisation_search"
+
+    id: int = Field(primary_key=True, sa_type=BigInteger, sa_column_kwargs={"autoincrement": False})
+    type: OrganisationTypes = Field(max_length=3, sa_column_kwargs={"nullable": False})
+    name: str = Field(max_length=256)
+    building_id: int = Field(sa_type=BigInteger)
+    latitude: Decimal
+    longitude: Decimal
+    # activities of the organisation and all their ancestors, so a parent activity matches with @>
+    activity_ids: list[int] = Field(sa_type=ARRAY(BigInteger))
+    address: str
+
     __table_args__ = (
-        Index(
-            "idx_org_name_trgm",
-            text("name gin_trgm_ops"),
-            postgresql_using="gin",
-        ),
+        Index("idx_org_search_name_lower_trgm", text("lower(name) gin_trgm_ops"), postgresql_using="gin"),
+        Index("idx_org_search_name_lower_prefix", text('(lower(name) COLLATE "C")'), "id"),
+        Index("idx_org_search_name_id", "name", "id"),
+        Index("idx_org_search_activity_ids", "activity_ids", postgresql_using="gin"),
+        Index("idx_org_search_building", "building_id"),
+        Index("idx_org_search_coords", "latitude", "longitude"),
     )
 
 
+class OrganisationSearchVersionModel(SQLModel, table=True):
+    """Single row, bumped by every transaction that changes organisation_search."""
+
+    __tablename__ = "organisation_search_version"
+
+    id: bool = Field(default=True, primary_key=True)
+    value: int = Field(default=0, sa_type=BigInteger)
+
+
 class OrganisationAddressModel(SQLModel, table=True):
     __tablename__ = "organisation_address"
 
     id: int = Field(primary_key=True, sa_type=BigInteger, sa_column_kwargs={"autoincrement": True})
     building_id: int = Field(foreign_key="building.id", sa_type=BigInteger)
     office: str = Field(max_length=128)
+    updated_at: datetime | None = Field(
+        default=None,
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": text("now()"), "nullable": False},
+    )
     building: "BuildingModel" = Relationship(back_populates="addresses")  # noqa: F821
     organisations: list["OrganisationModel"] = Relationship(back_populates="address")  # noqa: F821
 
+    __table_args__ = (Index("idx_org_address_building", "building_id"),)
+
 
 class PhoneModel(SQLModel, table=True):
     __tablename__ = "phone"
@@ -89,6 +138,8 @@ class PhoneModel(SQLModel, table=True):
     organisation_id: int = Field(foreign_key="organisation.id", sa_type=BigInteger)
     organisation: OrganisationModel = Relationship(back_populates="phones")
 
+    __table_args__ = (Index("idx_phone_org", "organisation_id", "phone"),)
+
 
 class OrganisationActivityModel(SQLModel, table=True):
     __tablename__ = "organisation_activity"
@@ -98,6 +149,11 @@ class OrganisationActivityModel(SQLModel, table=True):
     activity_id: int = Field(foreign_key="activity.id", sa_type=BigInteger)
     organisation: OrganisationModel = Relationship(back_populates="activities")
 
+    __table_args__ = (
+        Index("idx_org_activity_activity_org", "activity_id", "organisation_id"),
+        Index("idx_org_activity_org", "organisation_id", "activity_id"),
+    )
+
 
 class PhoneResponseModel(BaseModel):
     phone: str
@@ -116,14 +172,45 @@ class OrganisationDetailResponseModel(BaseModel):
     activities: list[ActivityResponseModel]
 
 
+class OrganisationBatchRequestModel(BaseModel):
+    ids: list[int] = PydanticField(min_length=1, max_length=200, description="Organisation ids")
+
+
+class OrganisationBatchResponseModel(BaseModel):
+    items: list[OrganisationDetailResponseModel]
+    missing: list[int] = PydanticField(description="Requested ids without an organisation")
+
+
 class OrganisationListResponseModel(BaseModel):
     id: int
     type: OrganisationTypes
     name: str
 
 
+class OrganisationNearbyResponseModel(OrganisationListResponseModel):
+    building_id: int
+    distance: float = PydanticField(description="Distance to the building in metres")
+
+
+class OrganisationNearbyFilterModel(BaseModel):
+    latitude: Decimal = PydanticField(ge=-90, le=90)
+    longitude: Decimal = PydanticField(ge=-180, le=180)
+    radius: float | None = PydanticField(None, gt=0, description="Search radius in metres, nearest if not set")
+    limit: int = PydanticField(10, ge=1, le=500, description="Max count of organisations")
+
+
+class OrganisationAutocompleteFilterModel(BaseModel):
+    prefix: str = PydanticField(min_length=1, max_length=256, description="Case-insensitive name prefix")
+    limit: int = PydanticField(10, ge=1, le=50, description="Max count of organisations")
+
+
 class OrganisationFilterModel(BaseModel):
     name: str | None = None
+    search_mode: OrganisationSearchMode = PydanticField(
+        OrganisationSearchMode.SUBSTRING,
+        description="substring: case-insensitive substring of the name, "
+        "fuzzy: trigram similarity to the name ordered by relevance, cursor is not supported",
+    )
     activity_id: int | None = None
     building_id: int | None = None
     latitude_from: Decimal | None = None
@@ -141,9 +228,53 @@ class OrganisationFilterModel(BaseModel):
         return self
 
 
+class OrganisationIngestAddressModel(BaseModel):
+    building_id: int
+    office: str = PydanticField(max_length=128)
+
+
+class OrganisationIngestModel(BaseModel):
+    """One NDJSON line of the bulk ingestion, the organisation as the registry has it now."""
+
+    id: int = PydanticField(gt=0)
+    type: OrganisationTypes | None = None
+    name: str | None = PydanticField(None, max_length=256)
+    address: OrganisationIngestAddressModel | None = None
+    phones: list[Annotated[str, PydanticField(max_length=14)]] = PydanticField(
+        [], description="Replace the phones of the organisation"
+    )
+    activity_ids: list[int] = PydanticField([], description="Replace the activities of the organisation")
+    deleted: bool = PydanticField(False, description="Remove the organisation with its phones, activities and address")
+
+    @model_validator(mode="after")
+    def check_fields_completeness(self) -> Self:
+        if not self.deleted and (self.type is None or self.name is None or self.address is None):
+            raise CustomValidationError(msg="type, name and address must be send unless deleted.")
+
+        return self
+
+
+class IngestBatchReportModel(BaseModel):
+    rows: int = PydanticField(description="Organisations in the batch, after dropping repeated ids")
+    changed: int = PydanticField(description="Organisations inserted or changed")
+    deleted: int
+    rejected: list[int] = PydanticField(description="Organisations referring to a missing building or activity")
+    seconds: float
+    rows_per_second: float
+
+
+class IngestReportModel(BaseModel):
+    batches: list[IngestBatchReportModel]
+    rows: int
+    seconds: float
+    rows_per_second: float
+
+
 __all__ = [
+    "OrganisationSearchMode",
     "OrganisationTypes",
     "OrganisationModel",
+    "OrganisationSearchModel",
     "PhoneModel",
     "OrganisationActivityModel",
 ]
@@ -1,28 +1,167 @@
-from collections.abc import AsyncGenerator
+import asyncio
+import logging
+from collections.abc import AsyncGenerator, AsyncIterator, Sequence
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
 from functools import lru_cache
+from operator import attrgetter
+from time import perf_counter
 
+import orjson
+from sqlalchemy import Executable, Select, event, make_url, text
+from sqlalchemy.engine import Connection, ExecutionContext
+from sqlalchemy.engine.default import CACHE_HIT
+from sqlalchemy.exc import InterfaceError, OperationalError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, Pool
+from sqlalchemy.sql import ClauseElement
+from sqlalchemy.sql.compiler import SQLCompiler
+from sqlalchemy.sql.visitors import InternalTraversal
 
+from app.metrics import Counter, Gauge, db_pool_wait, get_metrics_registry
+from app.request_stats import instrument_engine, record_pool_wait
 from app.settings import PGSettings, get_settings
 
+logger = logging.getLogger(__name__)
 
-def pg_engine(pg_settings: PGSettings, log_level: str) -> AsyncEngine:
+compiled_cache = get_metrics_registry().register(
+    Counter("db_compiled_cache_total", "SQLAlchemy compiled statement cache lookups", ("result",))
+)
+prepared_cache = get_metrics_registry().register(
+    Counter("db_prepared_cache_total", "asyncpg prepared statement cache lookups", ("result",))
+)
+
+# NULL while no WAL receiver runs: a disconnected replica has replayed everything it received and
+# would otherwise read as caught up. A connected one that replayed everything it received is not
+# lagging, however old its last transaction is.
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+    END
+    """
+)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long every checkout waited for a connection."""
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        started = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = perf_counter() - started
+            db_pool_wait.observe(waited)
+            record_pool_wait(waited)
+
+
+def pg_engine(pg_settings: PGSettings, log_level: str, db_url: str | None = None) -> AsyncEngine:
     return create_async_engine(
-        pg_settings.db_url,
+        db_url or pg_settings.db_url,
+        poolclass=TimedQueuePool,
         pool_size=pg_settings.POOL_MINSIZE,
         max_overflow=pg_settings.POOL_MAX_OVERFLOW,
         pool_timeout=pg_settings.POOL_TIMEOUT,
         pool_recycle=pg_settings.POOL_RECYCLE,
         pool_pre_ping=True,
+        query_cache_size=pg_settings.QUERY_CACHE_SIZE,
+        connect_args={"prepared_statement_cache_size": pg_settings.PREPARED_STATEMENT_CACHE_SIZE},
         echo=log_level == "debug",
     )
 
 
+def _count_statement_cache(conn: Connection, statement: str, context: ExecutionContext, **_: object) -> None:
+    compiled_cache.inc(("hit" if context.cache_hit == CACHE_HIT else "miss",))
+    # the asyncpg adapter keeps prepared statements in an LRU cache keyed by the SQL string
+    prepared = getattr(conn.connection.dbapi_connection, "_prepared_statement_cache", None)
+    if prepared is not None:
+        prepared_cache.inc(("hit" if statement in prepared else "miss",))
+
+
+def instrument_statement_cache(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "before_cursor_execute", _count_statement_cache, named=True)
+
+
+def statement_cache_stats() -> dict[str, dict[str, float]]:
+    stats = {}
+    for name, counter in (("compiled", compiled_cache), ("prepared", prepared_cache)):
+        hits, misses = counter.value(("hit",)), counter.value(("miss",))
+        stats[name] = {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 4) if hits else 0.0}
+    return stats
+
+
+class Explain(Executable, ClauseElement):
+    """``EXPLAIN (FORMAT JSON)`` of a statement, cached and prepared like the statement itself."""
+
+    inherit_cache = True
+    _traverse_internals = [("statement", InternalTraversal.dp_clauseelement)]
+
+    def __init__(self, statement: Select) -> None:
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler: SQLCompiler, **kw: object) -> str:
+    return f"EXPLAIN (FORMAT JSON) {compiler.process(element.statement, **kw)}"
+
+
+async def estimate_rows(session: AsyncSession, statement: Select, params: dict) -> int:
+    """Planner estimate of the rows ``statement`` returns, without running it."""
+    plan = (await session.execute(Explain(statement), params)).scalar_one()
+    if isinstance(plan, str | bytes):
+        plan = orjson.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def prewarm_pool(engine: AsyncEngine, size: int, statements: Sequence[tuple[Executable, dict]]) -> int:
+    """Open ``size`` pooled connections and run ``statements`` on each, returns how many were warmed.
+
+    Every connection is held until all of them are open, otherwise the pool would hand the
+    same connection back to the next task.
+    """
+    if size < 1:
+        return 0
+
+    opened = asyncio.Barrier(size)
+
+    async def warm() -> None:
+        try:
+            async with engine.connect() as connection:
+                for statement, params in statements:
+                    await connection.execute(statement, params)
+                await opened.wait()
+        except Exception:
+            # releases the tasks already waiting, the pool cannot be filled anyway
+            await opened.abort()
+            raise
+
+    results = await asyncio.gather(*(warm() for _ in range(size)), return_exceptions=True)
+    errors = [
+        result
+        for result in results
+        if isinstance(result, Exception) and not isinstance(result, asyncio.BrokenBarrierError)
+    ]
+    for error in errors:
+        if not isinstance(error, OSError | SQLAlchemyError):
+            raise error
+    if errors:
+        logger.warning("Pool prewarm failed: %s", errors[0])
+    return sum(result is None for result in results)
+
+
 @lru_cache
 def get_pg_engine() -> AsyncEngine:
     settings = get_settings()
-    return pg_engine(pg_settings=settings.PG, log_level=settings.LOG_LEVEL)
+    engine = pg_engine(pg_settings=settings.PG, log_level=settings.LOG_LEVEL)
+    instrument_engine(engine)
+    instrument_statement_cache(engine)
+    return engine
 
 
 @lru_cache
@@ -38,3 +177,179 @@ async def get_session() -> AsyncGenerator[AsyncSession]:
         except Exception as e:
             await session.rollback()
             raise e
+
+
+@dataclass(slots=True, eq=False)
+class Replica:
+    name: str
+    engine: AsyncEngine
+    factory: sessionmaker
+    outstanding: int = 0
+    healthy: bool = False
+    lag: float | None = None
+
+
+class ReadRouter:
+    """Read-only sessions bound to the healthy replica with the fewest outstanding sessions.
+
+    Replicas are checked every ``check_interval`` seconds, unreachable ones and ones lagging
+    more than ``max_lag`` seconds get no sessions until a later check passes. Without a
+    usable replica sessions are bound to the primary.
+    """
+
+    def __init__(
+        self, primary_factory: sessionmaker, replicas: list[Replica], max_lag: float, check_interval: float
+    ) -> None:
+        self.primary_factory = primary_factory
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._task: asyncio.Task | None = None
+
+    def pick(self) -> Replica | None:
+        healthy = (replica for replica in self.replicas if replica.healthy)
+        return min(healthy, key=attrgetter("outstanding"), default=None)
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
+        replica = self.pick()
+        if replica is None:
+            async with self.primary_factory() as session:
+                yield session
+            return
+
+        replica.outstanding += 1
+        try:
+            async with replica.factory() as session:
+                yield session
+        except (OSError, InterfaceError, OperationalError):
+            logger.warning("Replica %s failed, evicting it until the next check", replica.name)
+            replica.healthy = False
+            raise
+        finally:
+            replica.outstanding -= 1
+
+    async def check(self, replica: Replica) -> None:
+        try:
+            async with asyncio.timeout(self.check_interval), replica.engine.connect() as connection:
+                lag = (await connection.execute(REPLICA_LAG_QUERY)).scalar_one()
+        except (OSError, SQLAlchemyError, TimeoutError):
+            if replica.healthy:
+                logger.warning("Replica %s is unreachable", replica.name)
+            replica.healthy, replica.lag = False, None
+            return
+
+        if lag is None:
+            if replica.healthy:
+                logger.warning("Replica %s is not replicating", replica.name)
+            replica.healthy, replica.lag = False, None
+            return
+
+        lag = float(lag)
+
+        healthy = lag <= self.max_lag
+        if healthy != replica.healthy:
+            logger.warning("Replica %s is %s, lag %.3fs", replica.name, "healthy" if healthy else "lagging", lag)
+        replica.healthy, replica.lag = healthy, lag
+
+    async def start(self) -> None:
+        if not self.replicas:
+            return
+
+        await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.gather(*(replica.engine.dispose() for replica in self.replicas))
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+
+
+@lru_cache
+def get_read_router() -> ReadRouter:
+    settings = get_settings()
+    replicas = []
+    for dsn in settings.PG.REPLICAS:
+        url = make_url(dsn).set(drivername="postgresql+asyncpg")
+        engine = pg_engine(
+            pg_settings=settings.PG,
+            log_level=settings.LOG_LEVEL,
+            db_url=url.render_as_string(hide_password=False),
+        )
+        instrument_engine(engine)
+        instrument_statement_cache(engine)
+        replicas.append(
+            Replica(
+                name=f"{url.host}:{url.port or 5432}/{url.database}",
+                engine=engine,
+                factory=sessionmaker(engine, class_=AsyncSession, expire_on_commit=False),
+            )
+        )
+    return ReadRouter(
+        primary_factory=get_session_factory(),
+        replicas=replicas,
+        max_lag=settings.PG.REPLICA_MAX_LAG,
+        check_interval=settings.PG.REPLICA_CHECK_INTERVAL,
+    )
+
+
+async def get_read_session() -> AsyncGenerator[AsyncSession]:
+    async with get_read_router().session() as session:
+        try:
+            yield session
+        except Exception as e:
+            await session.rollback()
+            raise e
+
+
+def _pool_state(pool: Pool) -> list[tuple[str, float]]:
+    return [
+        ("size", pool.size()),
+        ("checked_out", pool.checkedout()),
+        ("checked_in", pool.checkedin()),
+        ("overflow", max(0, pool.overflow())),
+    ]
+
+
+def _pool_stats() -> list[tuple[tuple[str, ...], float]]:
+    return [((state,), value) for state, value in _pool_state(get_pg_engine().pool)]
+
+
+def _replica_pool_stats() -> list[tuple[tuple[str, ...], float]]:
+    return [
+        ((replica.name, state), value)
+        for replica in get_read_router().replicas
+        for state, value in _pool_state(replica.engine.pool)
+    ]
+
+
+def _replica_stats() -> list[tuple[tuple[str, ...], float]]:
+    return [
+        stat
+        for replica in get_read_router().replicas
+        for stat in (
+            ((replica.name, "healthy"), int(replica.healthy)),
+            ((replica.name, "outstanding"), replica.outstanding),
+            ((replica.name, "lag_seconds"), replica.lag if replica.lag is not None else float("nan")),
+        )
+    ]
+
+
+registry = get_metrics_registry()
+registry.register(Gauge("db_pool_connections", "Connection pool state", _pool_stats, labels=("state",)))
+registry.register(
+    Gauge(
+        "db_replica_pool_connections",
+        "Connection pool state per replica",
+        _replica_pool_stats,
+        labels=("replica", "state"),
+    )
+)
+registry.register(Gauge("db_replica", "Replica health, routed sessions and lag", _replica_stats, ("replica", "stat")))
@@ -0,0 +1,143 @@
+import logging
+import random
+import sys
+from contextvars import ContextVar
+from dataclasses import dataclass
+from time import perf_counter
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.engine import ExecutionContext
+from sqlalchemy.engine.interfaces import DBAPICursor
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.settings import get_settings
+
+access_logger = logging.getLogger("app.access")
+
+
+@dataclass(slots=True)
+class RequestStats:
+    statements: int = 0
+    db_time: float = 0.0
+    pool_wait: float = 0.0
+    rows: int = 0
+
+    def add(self, other: "RequestStats") -> None:
+        self.statements += other.statements
+        self.db_time += other.db_time
+        self.pool_wait += other.pool_wait
+        self.rows += other.rows
+
+    def server_timing(self, total: float) -> str:
+        app_time = max(0.0, total - self.db_time - self.pool_wait)
+        return (
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.statements} statements, {self.rows} rows", '
+            f"pool;dur={self.pool_wait * 1000:.2f}, "
+            f"app;dur={app_time * 1000:.2f}, "
+            f"total;dur={total * 1000:.2f}"
+        )
+
+
+# set only for sampled requests, the engine hooks are no-ops otherwise
+request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def record_pool_wait(seconds: float) -> None:
+    stats = request_stats.get()
+    if stats is not None:
+        stats.pool_wait += seconds
+
+
+def _before_cursor_execute(context: ExecutionContext, **_: object) -> None:
+    if request_stats.get() is not None:
+        context.request_stats_started = perf_counter()
+
+
+def _after_cursor_execute(cursor: DBAPICursor, context: ExecutionContext, **_: object) -> None:
+    stats = request_stats.get()
+    started = getattr(context, "request_stats_started", None)
+    if stats is None or started is None:
+        return
+
+    stats.statements += 1
+    stats.db_time += perf_counter() - started
+    # asyncpg reports the number of fetched rows in the command status, server side cursors report -1
+    stats.rows += max(0, cursor.rowcount)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute, named=True)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute, named=True)
+
+
+def setup_access_log() -> None:
+    if access_logger.handlers:
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    access_logger.addHandler(handler)
+    access_logger.setLevel(logging.INFO)
+    access_logger.propagate = False
+
+
+class RequestStatsMiddleware:
+    """Collect SQL statistics for a sample of requests.
+
+    Sampled responses get a ``Server-Timing`` header and a JSON access log line.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float | None = None) -> None:
+        self.app = app
+        self.sample_rate = get_settings().REQUEST_STATS_SAMPLE_RATE if sample_rate is None else sample_rate
+        setup_access_log()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        started = perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                timing = stats.server_timing(perf_counter() - started).encode("latin-1")
+                message["headers"] = [*message.get("headers", ()), (b"server-timing", timing)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_stats.reset(token)
+            route = scope.get("route")
+            access_logger.info(
+                orjson.dumps(
+                    {
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "route": route.path if route is not None else None,
+                        "status": status_code,
+                        "duration_ms": round((perf_counter() - started) * 1000, 3),
+                        "db_statements": stats.statements,
+                        "db_ms": round(stats.db_time * 1000, 3),
+                        "pool_wait_ms": round(stats.pool_wait * 1000, 3),
+                        "db_rows": stats.rows,
+                    }
+                ).decode()
+            )
+
+
+__all__ = [
+    "RequestStats",
+    "RequestStatsMiddleware",
+    "instrument_engine",
+    "record_pool_wait",
+    "request_stats",
+]
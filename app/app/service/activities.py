@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from collections.abc import Iterable
+from functools import lru_cache
+from itertools import chain
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import select
+
+from app.models.activities import ActivityModel
+from app.pg import AsyncSession, get_session_factory
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_CHANNEL = "activity_changed"
+
+
+class ActivityTree:
+    """Whole activity hierarchy kept in memory, next to activity_closure in the database.
+
+    Nodes are stored by position: ``ids[i]`` has parent ``parents[i]`` (-1 for roots) and
+    children ``children[i]``. Descendant ids of every node are precomputed on load, so a
+    lookup is a dict hit whatever the depth of the tree. Filters use it to answer requests
+    for unknown activities without a query.
+    """
+
+    def __init__(self) -> None:
+        self.ids: list[int] = []
+        self.parents: list[int] = []
+        self.children: list[list[int]] = []
+        self._descendants: dict[int, tuple[int, ...]] = {}
+        self.loaded = False
+        self._dirty = False
+        self._reload_task: asyncio.Task | None = None
+
+    def build(self, rows: Iterable[tuple[int, int | None]]) -> None:
+        rows = list(rows)
+        ids = [activity_id for activity_id, _ in rows]
+        positions = {activity_id: pos for pos, activity_id in enumerate(ids)}
+        parents = [positions.get(parent_id, -1) if parent_id is not None else -1 for _, parent_id in rows]
+        children: list[list[int]] = [[] for _ in ids]
+        for pos, parent in enumerate(parents):
+            if parent != -1:
+                children[parent].append(pos)
+
+        # breadth-first from roots, then fold descendants bottom-up; nodes caught in a cycle are unreachable
+        order = [pos for pos, parent in enumerate(parents) if parent == -1]
+        for pos in order:
+            order.extend(children[pos])
+        descendants: list[tuple[int, ...]] = [(activity_id,) for activity_id in ids]
+        for pos in reversed(order):
+            if children[pos]:
+                descendants[pos] = tuple(chain(descendants[pos], *(descendants[child] for child in children[pos])))
+
+        self.ids, self.parents, self.children = ids, parents, children
+        self._descendants = dict(zip(ids, descendants, strict=True))
+        self.loaded = True
+
+    def descendants(self, activity_id: int) -> tuple[int, ...]:
+        """Return ``activity_id`` itself followed by all of its descendants."""
+        return self._descendants.get(activity_id, (activity_id,))
+
+    def known(self, activity_id: int) -> bool:
+        """Whether the activity exists, every id counts as known until the tree is loaded."""
+        return not self.loaded or activity_id in self._descendants
+
+    async def load(self, session: AsyncSession) -> None:
+        result = await session.execute(select(ActivityModel.id, ActivityModel.parent_id).order_by(ActivityModel.id))
+        self.build(result.tuples().all())
+
+    async def reload(self) -> None:
+        factory = get_session_factory()
+        async with factory() as session:
+            await self.load(session)
+
+    def on_organisation_change(self, payload: str) -> None:
+        """Handle an ``organisation_changed`` notification, ``*`` follows bulk loads that bypass the triggers.
+
+        Unknown activities are answered without a query, so a tree that missed its ``activity_changed``
+        would hide them until the next reload; reconnects reload it as well.
+        """
+        if payload == "*":
+            self.schedule_reload()
+
+    def schedule_reload(self, *_: str) -> None:
+        self._dirty = True
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self._reload_while_dirty())
+
+    async def _reload_while_dirty(self) -> None:
+        while self._dirty:
+            self._dirty = False
+            try:
+                await self.reload()
+            except (SQLAlchemyError, OSError):
+                logger.exception("Activity tree reload failed")
+
+
+@lru_cache
+def get_activity_tree() -> ActivityTree:
+    return ActivityTree()
+
+
+__all__ = [
+    "ACTIVITY_CHANNEL",
+    "get_activity_tree",
+]
@@ -0,0 +1,273 @@
+import asyncio
+from collections import OrderedDict, defaultdict
+from collections.abc import Callable, Coroutine
+from contextvars import copy_context
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from time import monotonic
+
+from app.admission import AdaptiveLimiter, get_request_limiter
+from app.compression import CachedBody
+from app.metrics import CollectedCounter, Gauge, get_metrics_registry
+from app.request_stats import RequestStats, request_stats
+from app.settings import get_settings
+
+ALL_TAGS = "*"
+
+
+@dataclass(slots=True)
+class CacheEntry[V]:
+    value: V
+    expires_at: float
+    tags: tuple[str, ...]
+
+
+class TaggedLRUCache[V]:
+    """Bounded LRU cache with per-entry TTL and tag based invalidation.
+
+    Every entry is stored under the tags it was built from, so a change of any of
+    those rows drops exactly the entries that depend on it.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation = 0
+        self._entries: OrderedDict[object, CacheEntry[V]] = OrderedDict()
+        self._tags: defaultdict[str, set[object]] = defaultdict(set)
+        self._clear_handle: asyncio.TimerHandle | None = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: object) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.expires_at <= monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def set(self, key: object, value: V, tags: tuple[str, ...], generation: int | None = None) -> None:
+        # an invalidation that arrived while the value was being built may already describe a newer state
+        if self.maxsize <= 0 or (generation is not None and generation != self.generation):
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CacheEntry(value=value, expires_at=monotonic() + self.ttl, tags=tags)
+        for tag in tags:
+            self._tags[tag].add(key)
+
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, tag: str) -> None:
+        self.generation += 1
+        if tag == ALL_TAGS:
+            self.clear()
+            return
+
+        for key in self._tags.pop(tag, ()):
+            self._remove(key)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self.generation += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._tags.clear()
+
+    def schedule_clear(self, delay: float) -> None:
+        """Clear the cache ``delay`` seconds from now, once for every call made until then.
+
+        A batch of writes sends a notification per row, this turns the burst into a single clear.
+        """
+        if self._clear_handle is None:
+            self._clear_handle = asyncio.get_running_loop().call_later(delay, self._scheduled_clear)
+
+    def _scheduled_clear(self) -> None:
+        self._clear_handle = None
+        self.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _remove(self, key: object) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class ChangeCounter:
+    """Changes seen by this process, so a read started before a change is not joined after it."""
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def bump(self, *_: object) -> None:
+        self.value += 1
+
+
+@dataclass(slots=True)
+class Flight[V]:
+    task: asyncio.Task[V]
+    stats: RequestStats
+    waiters: int = 0
+    holds_slot: bool = False
+
+
+class SingleFlight[V]:
+    """Concurrent calls with the same key share one execution and its result.
+
+    The first caller starts the work as a task and every caller, the first one included,
+    waits for it through ``asyncio.shield``: a cancelled caller stops waiting, the work
+    carries on for the others. The key is forgotten once the work is done, so only calls
+    overlapping in time are coalesced, nothing is cached.
+
+    The work collects its own request stats, every caller that waited for it to the end
+    gets them. When the last caller is gone, the work takes a slot of ``limiter`` until it is
+    done, so it still counts against the admission limit.
+    """
+
+    def __init__(self, limiter: AdaptiveLimiter | None = None) -> None:
+        self.limiter = limiter
+        self.started = 0
+        self.joined = 0
+        self._flights: dict[object, Flight[V]] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: object, work: Callable[[], Coroutine[object, object, V]]) -> V:
+        flight = self._flights.get(key)
+        if flight is None:
+            # not the stats of the first caller, the statements are run for every caller alike
+            stats = RequestStats()
+            context = copy_context()
+            context.run(request_stats.set, stats)
+            flight = self._flights[key] = Flight(asyncio.create_task(work(), context=context), stats)
+            flight.task.add_done_callback(partial(self._done, key))
+            self.started += 1
+        else:
+            self.joined += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.task.done():
+                if (caller_stats := request_stats.get()) is not None:
+                    caller_stats.add(flight.stats)
+            elif not flight.waiters and not flight.holds_slot and self.limiter is not None:
+                # the caller frees its admission slot right after this, the work takes it over
+                flight.holds_slot = True
+                self.limiter.hold()
+                flight.task.add_done_callback(partial(self._release_slot, self.limiter))
+
+    @staticmethod
+    def _release_slot(limiter: AdaptiveLimiter, _: asyncio.Task[V]) -> None:
+        limiter.release(latency=None)
+
+    def _done(self, key: object, task: asyncio.Task[V]) -> None:
+        flight = self._flights.get(key)
+        if flight is not None and flight.task is task:
+            del self._flights[key]
+        # every waiter may be gone, the error is still marked as retrieved
+        if not task.cancelled():
+            task.exception()
+
+
+@lru_cache
+def get_detail_cache() -> TaggedLRUCache[tuple[str, CachedBody]]:
+    """Serialized organisation details with their ETags and encoded variants."""
+    settings = get_settings()
+    return TaggedLRUCache(maxsize=settings.DETAIL_CACHE_SIZE, ttl=settings.DETAIL_CACHE_TTL)
+
+
+@lru_cache
+def get_catalogue_version() -> ChangeCounter:
+    return ChangeCounter()
+
+
+@lru_cache
+def get_count_cache() -> TaggedLRUCache[int]:
+    settings = get_settings()
+    return TaggedLRUCache(maxsize=settings.COUNT_CACHE_SIZE, ttl=settings.COUNT_CACHE_TTL)
+
+
+@lru_cache
+def get_single_flight() -> SingleFlight:
+    """In-flight organisation reads, shared by the list and detail keys."""
+    return SingleFlight(limiter=get_request_limiter())
+
+
+def _detail_cache_counters() -> list[tuple[tuple[str, ...], float]]:
+    cache = get_detail_cache()
+    return [
+        (("hit",), cache.hits),
+        (("miss",), cache.misses),
+        (("eviction",), cache.evictions),
+        (("invalidation",), cache.invalidations),
+    ]
+
+
+registry = get_metrics_registry()
+registry.register(
+    Gauge("detail_cache_entries", "Organisation detail cache size", lambda: [((), len(get_detail_cache()))])
+)
+registry.register(
+    CollectedCounter(
+        "detail_cache_events_total", "Organisation detail cache events", _detail_cache_counters, labels=("event",)
+    )
+)
+registry.register(
+    Gauge("single_flight_in_flight", "Coalesced reads in flight", lambda: [((), len(get_single_flight()))])
+)
+registry.register(
+    CollectedCounter(
+        "single_flight_calls_total",
+        "Coalesced reads by whether they started the work or joined one in flight",
+        lambda: [(("started",), get_single_flight().started), (("joined",), get_single_flight().joined)],
+        labels=("role",),
+    )
+)
+
+
+__all__ = [
+    "ALL_TAGS",
+    "ChangeCounter",
+    "SingleFlight",
+    "TaggedLRUCache",
+    "get_catalogue_version",
+    "get_count_cache",
+    "get_detail_cache",
+    "get_single_flight",
+]
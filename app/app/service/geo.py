@@ -0,0 +1,192 @@
+import asyncio
+import heapq
+import logging
+from collections.abc import Iterable
+from functools import lru_cache
+from math import asin, cos, floor, radians, sin, sqrt
+
+from sqlalchemy import any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import BigInteger, select
+
+from app.models.buildings import BuildingModel
+from app.pg import AsyncSession, get_session_factory
+from app.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6_371_008.8
+METRES_PER_DEGREE = 111_195.0
+MAX_DISTANCE_M = 20_037_509.0
+
+type Point = tuple[float, float]
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in metres."""
+    d_lat = radians(lat2 - lat1)
+    d_lon = radians(lon2 - lon1)
+    a = sin(d_lat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(d_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * asin(min(1.0, sqrt(a)))
+
+
+class BuildingGridIndex:
+    """Building coordinates bucketed into a uniform latitude/longitude grid.
+
+    A radius query only visits the cells overlapping the bounding box of the circle,
+    and a nearest query widens the radius until enough buildings are found. Unlike a
+    KD-tree the grid supports cheap single building upserts and removals.
+    """
+
+    def __init__(self, cell_deg: float) -> None:
+        self.cell_deg = cell_deg
+        self._cols = max(1, round(360.0 / cell_deg))
+        self._points: dict[int, Point] = {}
+        self._cells: dict[tuple[int, int], dict[int, Point]] = {}
+        self._dirty: set[int] = set()
+        self._reload_all = False
+        self._refresh_task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _cell(self, latitude: float, longitude: float) -> tuple[int, int]:
+        return floor(latitude / self.cell_deg), self._wrap(floor(longitude / self.cell_deg))
+
+    def _wrap(self, col: int) -> int:
+        # columns are kept in [-half, half) so cells on both sides of the antimeridian are neighbours
+        half = self._cols // 2
+        return (col + half) % self._cols - half
+
+    def build(self, rows: Iterable[tuple[int, float, float]]) -> None:
+        points: dict[int, Point] = {}
+        cells: dict[tuple[int, int], dict[int, Point]] = {}
+        for building_id, latitude, longitude in rows:
+            point = (float(latitude), float(longitude))
+            points[building_id] = point
+            cells.setdefault(self._cell(*point), {})[building_id] = point
+        self._points, self._cells = points, cells
+
+    def upsert(self, building_id: int, latitude: float, longitude: float) -> None:
+        self.remove(building_id)
+        point = (float(latitude), float(longitude))
+        self._points[building_id] = point
+        self._cells.setdefault(self._cell(*point), {})[building_id] = point
+
+    def remove(self, building_id: int) -> None:
+        point = self._points.pop(building_id, None)
+        if point is None:
+            return
+
+        cell = self._cell(*point)
+        self._cells[cell].pop(building_id, None)
+        if not self._cells[cell]:
+            del self._cells[cell]
+
+    def within(self, latitude: float, longitude: float, radius: float, limit: int) -> list[tuple[float, int]]:
+        """Return up to ``limit`` (distance, building_id) pairs within ``radius`` metres, nearest first."""
+        lat_span = radius / METRES_PER_DEGREE
+        lat_from, lat_to = max(-90.0, latitude - lat_span), min(90.0, latitude + lat_span)
+        max_cos = min(cos(radians(lat_from)), cos(radians(lat_to)))
+        lon_span = lat_span / max_cos if max_cos > 0 else 360.0
+
+        row_from, row_to = floor(lat_from / self.cell_deg), floor(lat_to / self.cell_deg)
+        if lon_span >= 180.0:  # noqa: PLR2004
+            cols = set(range(-(self._cols // 2), self._cols - self._cols // 2))
+        else:
+            col_from, col_to = (
+                floor((longitude - lon_span) / self.cell_deg),
+                floor((longitude + lon_span) / self.cell_deg),
+            )
+            cols = {self._wrap(col) for col in range(col_from, col_to + 1)}
+
+        candidates = []
+        if (row_to - row_from + 1) * len(cols) > len(self._cells):
+            buckets = (
+                bucket for (row, col), bucket in self._cells.items() if row_from <= row <= row_to and col in cols
+            )
+        else:
+            buckets = (
+                self._cells[cell]
+                for cell in ((row, col) for row in range(row_from, row_to + 1) for col in cols)
+                if cell in self._cells
+            )
+        for bucket in buckets:
+            for building_id, (lat, lon) in bucket.items():
+                distance = haversine(latitude, longitude, lat, lon)
+                if distance <= radius:
+                    candidates.append((distance, building_id))
+        return heapq.nsmallest(limit, candidates)
+
+    def nearest(self, latitude: float, longitude: float, limit: int) -> list[tuple[float, int]]:
+        """Return the ``limit`` nearest (distance, building_id) pairs."""
+        radius = self.cell_deg * METRES_PER_DEGREE
+        while True:
+            found = self.within(latitude, longitude, radius, limit)
+            if len(found) >= limit or radius >= MAX_DISTANCE_M:
+                return found
+            radius = min(radius * 4, MAX_DISTANCE_M)
+
+    async def load(self, session: AsyncSession) -> None:
+        statement = select(BuildingModel.id, BuildingModel.latitude, BuildingModel.longitude)
+        self.build((await session.execute(statement)).tuples().all())
+
+    async def reload(self) -> None:
+        factory = get_session_factory()
+        async with factory() as session:
+            await self.load(session)
+
+    def on_change(self, payload: str) -> None:
+        """Handle an ``organisation_changed`` notification, only building changes move points."""
+        prefix, _, building_id = payload.partition(":")
+        if payload == "*":
+            self.schedule_reload()
+        elif prefix == "building" and building_id.isdigit():
+            self._dirty.add(int(building_id))
+            self._schedule_refresh()
+
+    def schedule_reload(self) -> None:
+        self._reload_all = True
+        self._schedule_refresh()
+
+    def _schedule_refresh(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+
+    async def _refresh(self) -> None:
+        while self._reload_all or self._dirty:
+            reload_all, self._reload_all = self._reload_all, False
+            dirty, self._dirty = self._dirty, set()
+            try:
+                if reload_all:
+                    await self.reload()
+                else:
+                    await self._refresh_buildings(list(dirty))
+            except (SQLAlchemyError, OSError):
+                logger.exception("Building index refresh failed")
+
+    async def _refresh_buildings(self, building_ids: list[int]) -> None:
+        statement = select(BuildingModel.id, BuildingModel.latitude, BuildingModel.longitude).where(
+            BuildingModel.id == any_(bindparam("building_ids", building_ids, type_=ARRAY(BigInteger)))
+        )
+        factory = get_session_factory()
+        async with factory() as session:
+            rows = (await session.execute(statement)).tuples().all()
+
+        for building_id in building_ids:
+            self.remove(building_id)
+        for building_id, latitude, longitude in rows:
+            self.upsert(building_id, latitude, longitude)
+
+
+@lru_cache
+def get_building_index() -> BuildingGridIndex:
+    settings = get_settings()
+    return BuildingGridIndex(cell_deg=settings.GEO_INDEX_CELL_DEG)
+
+
+__all__ = [
+    "BuildingGridIndex",
+    "get_building_index",
+]
@@ -0,0 +1,323 @@
+import asyncio
+from collections.abc import AsyncIterable, AsyncIterator
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from time import perf_counter
+
+import asyncpg
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.exceptions import CustomValidationError, IngestBusyError
+from app.models.organisations import IngestBatchReportModel, IngestReportModel, OrganisationIngestModel
+from app.pg import get_pg_engine
+from app.settings import get_settings
+
+# ON COMMIT DELETE ROWS keeps the tables on the pooled connection, every batch starts empty and
+# statements on them keep their prepared plans
+STAGING_TABLES = """
+CREATE TEMP TABLE IF NOT EXISTS ingest_organisation (
+    id bigint PRIMARY KEY,
+    type organisationtypes,
+    name varchar(256),
+    building_id bigint,
+    office varchar(128),
+    deleted boolean NOT NULL,
+    previous_address_id bigint,
+    address_id bigint
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS ingest_phone (
+    organisation_id bigint NOT NULL,
+    phone varchar(14) NOT NULL
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS ingest_activity (
+    organisation_id bigint NOT NULL,
+    activity_id bigint NOT NULL
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS ingest_touched (
+    organisation_id bigint NOT NULL,
+    children boolean NOT NULL
+) ON COMMIT DELETE ROWS;
+SET LOCAL app.bulk_ingest = 'on';
+"""
+STAGING_COLUMNS = {
+    "ingest_organisation": ["id", "type", "name", "building_id", "office", "deleted"],
+    "ingest_phone": ["organisation_id", "phone"],
+    "ingest_activity": ["organisation_id", "activity_id"],
+}
+
+REJECT_UNKNOWN_REFERENCES = """
+DELETE FROM ingest_organisation s
+WHERE NOT s.deleted AND (
+    NOT EXISTS (SELECT 1 FROM building b WHERE b.id = s.building_id)
+    OR EXISTS (
+        SELECT 1 FROM ingest_activity sa
+        WHERE sa.organisation_id = s.id AND NOT EXISTS (SELECT 1 FROM activity a WHERE a.id = sa.activity_id)
+    )
+)
+RETURNING s.id
+"""
+# an organisation keeps its address row only while it is the only one there, updating a row other
+# organisations point to would move them as well; new and sharing organisations get a fresh row
+ASSIGN_ADDRESSES = """
+UPDATE ingest_organisation s SET previous_address_id = o.address_id FROM organisation o WHERE o.id = s.id;
+UPDATE ingest_organisation s SET address_id = s.previous_address_id
+WHERE s.deleted OR NOT EXISTS (
+    SELECT 1 FROM organisation o WHERE o.address_id = s.previous_address_id AND o.id <> s.id
+);
+UPDATE ingest_organisation SET address_id = nextval(pg_get_serial_sequence('organisation_address', 'id'))
+WHERE address_id IS NULL AND NOT deleted;
+"""
+# unchanged rows are skipped, so they fire no triggers and invalidate no caches
+UPSERT_ADDRESSES = """
+WITH changed AS (
+    INSERT INTO organisation_address (id, building_id, office)
+    SELECT address_id, building_id, office FROM ingest_organisation WHERE NOT deleted
+    ON CONFLICT (id) DO UPDATE SET building_id = EXCLUDED.building_id, office = EXCLUDED.office
+    WHERE (organisation_address.building_id, organisation_address.office)
+        IS DISTINCT FROM (EXCLUDED.building_id, EXCLUDED.office)
+    RETURNING id
+)
+INSERT INTO ingest_touched SELECT s.id, false FROM changed JOIN ingest_organisation s ON s.address_id = changed.id
+"""
+UPSERT_ORGANISATIONS = """
+WITH changed AS (
+    INSERT INTO organisation (id, type, name, address_id)
+    SELECT id, type, name, address_id FROM ingest_organisation WHERE NOT deleted
+    ON CONFLICT (id) DO UPDATE SET type = EXCLUDED.type, name = EXCLUDED.name, address_id = EXCLUDED.address_id
+    WHERE (organisation.type, organisation.name, organisation.address_id)
+        IS DISTINCT FROM (EXCLUDED.type, EXCLUDED.name, EXCLUDED.address_id)
+    RETURNING id
+)
+INSERT INTO ingest_touched SELECT id, false FROM changed
+"""
+# the ids come from the registry, later inserts without an id must not collide with them
+ADVANCE_ORGANISATION_SEQUENCE = """
+SELECT setval(pg_get_serial_sequence('organisation', 'id'), max(id)) FROM organisation
+HAVING max(id) > coalesce(pg_sequence_last_value(pg_get_serial_sequence('organisation', 'id')::regclass), 0)
+"""
+# only the difference is written, deleted organisations lose all their children
+REPLACE_PHONES = """
+WITH removed AS (
+    DELETE FROM phone p USING ingest_organisation s
+    WHERE p.organisation_id = s.id AND (
+        s.deleted
+        OR NOT EXISTS (
+            SELECT 1 FROM ingest_phone sp WHERE sp.organisation_id = p.organisation_id AND sp.phone = p.phone
+        )
+    )
+    RETURNING p.organisation_id
+), added AS (
+    INSERT INTO phone (phone, organisation_id)
+    SELECT DISTINCT sp.phone, sp.organisation_id
+    FROM ingest_phone sp JOIN ingest_organisation s ON s.id = sp.organisation_id AND NOT s.deleted
+    WHERE NOT EXISTS (SELECT 1 FROM phone p WHERE p.organisation_id = sp.organisation_id AND p.phone = sp.phone)
+    RETURNING organisation_id
+)
+INSERT INTO ingest_touched SELECT organisation_id, true FROM removed UNION SELECT organisation_id, true FROM added
+"""
+REPLACE_ACTIVITIES = """
+WITH removed AS (
+    DELETE FROM organisation_activity oa USING ingest_organisation s
+    WHERE oa.organisation_id = s.id AND (
+        s.deleted
+        OR NOT EXISTS (
+            SELECT 1 FROM ingest_activity sa
+            WHERE sa.organisation_id = oa.organisation_id AND sa.activity_id = oa.activity_id
+        )
+    )
+    RETURNING oa.organisation_id
+), added AS (
+    INSERT INTO organisation_activity (organisation_id, activity_id)
+    SELECT DISTINCT sa.organisation_id, sa.activity_id
+    FROM ingest_activity sa JOIN ingest_organisation s ON s.id = sa.organisation_id AND NOT s.deleted
+    WHERE NOT EXISTS (
+        SELECT 1 FROM organisation_activity oa
+        WHERE oa.organisation_id = sa.organisation_id AND oa.activity_id = sa.activity_id
+    )
+    RETURNING organisation_id
+)
+INSERT INTO ingest_touched SELECT organisation_id, true FROM removed UNION SELECT organisation_id, true FROM added
+"""
+# what the skipped touch_organisation() triggers would have done, once per organisation
+TOUCH_ORGANISATIONS = """
+UPDATE organisation SET updated_at = clock_timestamp()
+WHERE id IN (SELECT organisation_id FROM ingest_touched WHERE children)
+"""
+# address rows left without an organisation, by deletion or because all their organisations moved out
+DELETE_ORGANISATIONS = """
+DELETE FROM organisation o USING ingest_organisation s WHERE o.id = s.id AND s.deleted;
+DELETE FROM organisation_address a USING ingest_organisation s
+WHERE a.id = s.previous_address_id AND NOT EXISTS (SELECT 1 FROM organisation o WHERE o.address_id = a.id);
+"""
+# deleted organisations that existed are the ones that had an address row
+COUNT_CHANGES = """
+SELECT
+    (
+        SELECT count(DISTINCT t.organisation_id)
+        FROM ingest_touched t JOIN ingest_organisation s ON s.id = t.organisation_id
+        WHERE NOT s.deleted
+    ),
+    (SELECT count(*) FROM ingest_organisation WHERE deleted AND previous_address_id IS NOT NULL)
+"""
+# what the skipped organisation_search_changed() triggers would have done, in one call
+REFRESH_SEARCH = """
+SELECT refresh_organisation_search(ARRAY(
+    SELECT organisation_id FROM ingest_touched UNION SELECT id FROM ingest_organisation WHERE deleted
+))
+"""
+
+
+class OrganisationIngestService:
+    """Bulk organisation upserts from NDJSON.
+
+    A batch is copied into temporary staging tables and applied with the same few set-based
+    statements in one transaction, whatever its size. The row triggers refreshing
+    organisation_search and touching the organisation of a changed phone or activity are
+    skipped for the transaction and done once for the whole batch instead. The notify
+    triggers still fire, so running services drop exactly the changed organisations.
+    At most ``concurrency`` ingestions run at once, see ``slot``.
+    """
+
+    def __init__(self, engine: AsyncEngine, batch_size: int, concurrency: int) -> None:
+        self.engine = engine
+        self.batch_size = batch_size
+        self._running = asyncio.Semaphore(concurrency)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of the ``concurrency`` slots, raise IngestBusyError right away when none is free."""
+        # an ingestion holds a connection and row locks for its whole run, queueing them only piles those up
+        if self._running.locked():
+            raise IngestBusyError
+        async with self._running:
+            yield
+
+    @staticmethod
+    def _records(batch: list[OrganisationIngestModel]) -> dict[str, list[tuple]]:
+        records: dict[str, list[tuple]] = {table: [] for table in STAGING_COLUMNS}
+        for item in batch:
+            address = item.address
+            records["ingest_organisation"].append(
+                (
+                    item.id,
+                    item.type.value if item.type else None,
+                    item.name,
+                    address.building_id if address else None,
+                    address.office if address else None,
+                    item.deleted,
+                )
+            )
+            records["ingest_phone"].extend((item.id, phone) for phone in dict.fromkeys(item.phones))
+            records["ingest_activity"].extend(
+                (item.id, activity_id) for activity_id in dict.fromkeys(item.activity_ids)
+            )
+        return records
+
+    async def _apply(self, connection: asyncpg.Connection, batch: list[OrganisationIngestModel]) -> tuple:
+        await connection.execute(STAGING_TABLES)
+        for table, records in self._records(batch).items():
+            await connection.copy_records_to_table(table, records=records, columns=STAGING_COLUMNS[table])
+        await connection.execute("ANALYZE ingest_organisation, ingest_phone, ingest_activity")
+
+        rejected = [row["id"] for row in await connection.fetch(REJECT_UNKNOWN_REFERENCES)]
+        for statement in (
+            ASSIGN_ADDRESSES,
+            UPSERT_ADDRESSES,
+            UPSERT_ORGANISATIONS,
+            ADVANCE_ORGANISATION_SEQUENCE,
+            REPLACE_PHONES,
+            REPLACE_ACTIVITIES,
+            TOUCH_ORGANISATIONS,
+        ):
+            await connection.execute(statement)
+        await connection.execute(DELETE_ORGANISATIONS)
+        changed, deleted = await connection.fetchrow(COUNT_CHANGES)
+        await connection.execute(REFRESH_SEARCH)
+        return changed, deleted, sorted(rejected)
+
+    async def ingest_batch(self, batch: list[OrganisationIngestModel]) -> IngestBatchReportModel:
+        # the last line of an organisation wins
+        batch = list({item.id: item for item in batch}.values())
+        started = perf_counter()
+        async with self.engine.connect() as connection:
+            # COPY needs the driver connection, the transaction is its own and ends before the connection is returned
+            driver: asyncpg.Connection = (await connection.get_raw_connection()).driver_connection
+            async with driver.transaction():
+                changed, deleted, rejected = await self._apply(driver, batch)
+        seconds = perf_counter() - started
+        return IngestBatchReportModel(
+            rows=len(batch),
+            changed=changed,
+            deleted=deleted,
+            rejected=rejected,
+            seconds=round(seconds, 4),
+            rows_per_second=round(len(batch) / seconds, 1) if seconds else 0.0,
+        )
+
+    async def ingest_lines(self, lines: AsyncIterable[bytes]) -> AsyncIterator[IngestBatchReportModel]:
+        """Apply NDJSON lines in batches of ``batch_size`` organisations, yielding a report per batch.
+
+        A malformed line stops the ingestion, the batches before it stay applied.
+        """
+        batch: list[OrganisationIngestModel] = []
+        applied = 0
+        number = 0
+        async for line in lines:
+            number += 1
+            if not line.strip():
+                continue
+
+            try:
+                batch.append(OrganisationIngestModel.model_validate_json(line))
+            except (ValidationError, CustomValidationError) as e:
+                msg = e.msg if isinstance(e, CustomValidationError) else str(e.errors(include_url=False))
+                raise CustomValidationError(
+                    msg=f"line {number}: {msg.rstrip('.')}, the first {applied} lines were applied."
+                ) from e
+
+            if len(batch) >= self.batch_size:
+                yield await self.ingest_batch(batch)
+                batch, applied = [], number
+
+        if batch:
+            yield await self.ingest_batch(batch)
+
+
+def ingest_report(batches: list[IngestBatchReportModel]) -> IngestReportModel:
+    rows = sum(batch.rows for batch in batches)
+    seconds = sum(batch.seconds for batch in batches)
+    return IngestReportModel(
+        batches=batches,
+        rows=rows,
+        seconds=round(seconds, 4),
+        rows_per_second=round(rows / seconds, 1) if seconds else 0.0,
+    )
+
+
+async def ndjson_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream into lines, however the chunks are cut."""
+    tail = b""
+    async for chunk in chunks:
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line
+    if tail:
+        yield tail
+
+
+@lru_cache
+def get_ingest_service() -> OrganisationIngestService:
+    settings = get_settings()
+    return OrganisationIngestService(
+        engine=get_pg_engine(), batch_size=settings.INGEST_BATCH_SIZE, concurrency=settings.INGEST_CONCURRENCY
+    )
+
+
+__all__ = [
+    "OrganisationIngestService",
+    "get_ingest_service",
+    "ingest_report",
+    "ndjson_lines",
+]
@@ -1,120 +1,472 @@
-from decimal import Decimal
-from functools import lru_cache
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
+from contextlib import AbstractAsyncContextManager
+from datetime import datetime
+from functools import lru_cache, partial
 
+import orjson
+from sqlalchemy import Executable, Select, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, array
 from sqlalchemy.orm import joinedload, selectinload
-from sqlmodel import func, select, union_all
+from sqlmodel import BigInteger, Integer, String, func, select, tuple_
 
-from app.exceptions import OrganisationNotFoundError
-from app.models.activities import ActivityModel
-from app.models.buildings import BuildingModel, StreetModel
-from app.models.common import PaginatedResponseModel, PaginatorModel
+from app.compression import CachedBody
+from app.etag import make_etag
+from app.exceptions import CustomValidationError, OrganisationNotFoundError
+from app.models.buildings import BuildingModel, CityModel, StreetModel
+from app.models.common import CountMode, CursorDirection, CursorModel, PaginatorModel
 from app.models.organisations import (
     ActivityResponseModel,
-    OrganisationActivityModel,
     OrganisationAddressModel,
+    OrganisationAutocompleteFilterModel,
     OrganisationDetailResponseModel,
     OrganisationFilterModel,
-    OrganisationListResponseModel,
     OrganisationModel,
+    OrganisationNearbyFilterModel,
+    OrganisationNearbyResponseModel,
+    OrganisationSearchMode,
+    OrganisationSearchModel,
+    OrganisationSearchVersionModel,
     PhoneResponseModel,
 )
-from app.pg import AsyncSession
+from app.pg import AsyncSession, estimate_rows, get_read_router, get_session_factory
+from app.service.activities import get_activity_tree
+from app.service.cache import (
+    ChangeCounter,
+    SingleFlight,
+    TaggedLRUCache,
+    get_catalogue_version,
+    get_count_cache,
+    get_detail_cache,
+    get_single_flight,
+)
+from app.service.geo import get_building_index
+from app.settings import get_settings
+
+ORGANISATION_CHANNEL = "organisation_changed"
+
+
+LOWER_NAME = func.lower(OrganisationSearchModel.name)
+LIST_COLUMNS = (OrganisationSearchModel.id, OrganisationSearchModel.type, OrganisationSearchModel.name)
+LIKE_ESCAPE = str.maketrans({"\\": "\\\\", "%": "\\%", "_": "\\_"})
+
+# which of building_id, bounding box, activity_id filters are set and how the name is matched
+type FilterVariant = tuple[bool, bool, bool, OrganisationSearchMode | None]
+
+
+def prefix_upper_bound(prefix: str) -> str:
+    """Smallest string greater than every string starting with ``prefix`` in code point order."""
+    prefix = prefix.rstrip(chr(0x10FFFF))
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1) if prefix else chr(0x10FFFF)
 
 
 class OrganisationsService:
-    @staticmethod
-    def _filter_by_activity_id(statement, activity_id: int):  # noqa: ANN205, ANN001
-        sel_children_1 = select(ActivityModel.id).where(ActivityModel.parent_id == activity_id)
-        sel_children_2 = select(ActivityModel.id).where(ActivityModel.parent_id.in_(sel_children_1))
-        sel_parent = select(ActivityModel.id).where(ActivityModel.id == activity_id)
-        all_activity_ids = union_all(sel_parent, sel_children_1, sel_children_2).subquery()
-        sel_org_ids = (
-            select(OrganisationActivityModel.organisation_id).where(
-                OrganisationActivityModel.activity_id.in_(all_activity_ids)
+    """Organisation queries.
+
+    Statements are built once per filter combination with bind parameters for every value,
+    so repeated requests reuse both the compiled SQL and the prepared statement.
+    """
+
+    def __init__(
+        self,
+        detail_cache: TaggedLRUCache[tuple[str, CachedBody]],
+        count_cache: TaggedLRUCache[int],
+        catalogue_version: ChangeCounter,
+        single_flight: SingleFlight,
+        count_exact_threshold: int,
+    ) -> None:
+        self.detail_cache = detail_cache
+        self.count_cache = count_cache
+        self.catalogue_version = catalogue_version
+        self.single_flight = single_flight
+        self.count_exact_threshold = count_exact_threshold
+        self._list_statements: dict[tuple[FilterVariant, CursorDirection | None], Select] = {}
+        self._export_statements: dict[FilterVariant, Select] = {}
+        self._count_statements: dict[FilterVariant, Select] = {}
+        self._match_statements: dict[FilterVariant, Select] = {}
+        self._detail_by_id = self._detail_statement().where(OrganisationModel.id == bindparam("organisation_id"))
+        self._detail_by_ids = self._detail_statement().where(
+            OrganisationModel.id == any_(bindparam("organisation_ids", type_=ARRAY(BigInteger)))
+        )
+        # versions of every row the detail is built from, primary key lookups only
+        self._detail_version = (
+            select(
+                OrganisationModel.updated_at,
+                OrganisationAddressModel.updated_at,
+                BuildingModel.updated_at,
+                StreetModel.updated_at,
+                CityModel.updated_at,
             )
-        ).subquery()
-        return statement.where(OrganisationModel.id.in_(sel_org_ids))
+            .join(OrganisationAddressModel, OrganisationModel.address_id == OrganisationAddressModel.id)
+            .join(BuildingModel, OrganisationAddressModel.building_id == BuildingModel.id)
+            .join(StreetModel, BuildingModel.street_id == StreetModel.id)
+            .join(CityModel, StreetModel.city_id == CityModel.id)
+            .where(OrganisationModel.id == bindparam("organisation_id"))
+        )
+        self._nearby_statement = select(*LIST_COLUMNS, OrganisationSearchModel.building_id).where(
+            OrganisationSearchModel.building_id == any_(bindparam("building_ids", type_=ARRAY(BigInteger)))
+        )
+        self._list_version = select(OrganisationSearchVersionModel.value)
+        # matches idx_org_search_name_lower_prefix, byte-wise order turns a prefix into a range
+        prefix_key = LOWER_NAME.collate("C")
+        self._autocomplete_statement = (
+            select(*LIST_COLUMNS)
+            .where(prefix_key >= bindparam("prefix_from"), prefix_key < bindparam("prefix_to"))
+            .order_by(prefix_key, OrganisationSearchModel.id)
+            .limit(bindparam("limit", type_=Integer))
+        )
 
     @staticmethod
-    def _filter_by_building_id(statement, building_id: int):  # noqa: ANN205, ANN001
-        statement = statement.where(OrganisationAddressModel.building_id == building_id)
+    def _filter_by_activity_id(statement):  # noqa: ANN205, ANN001
+        # activity_ids already holds the ancestors, served by idx_org_search_activity_ids
+        activity_ids = array([bindparam("activity_id", type_=BigInteger)])
+        return statement.where(OrganisationSearchModel.activity_ids.contains(activity_ids))
+
+    @staticmethod
+    def _filter_by_building_id(statement):  # noqa: ANN205, ANN001
+        statement = statement.where(OrganisationSearchModel.building_id == bindparam("building_id"))
         return statement
 
     @staticmethod
-    def _filter_by_latitude_longitude(  # noqa: ANN205
-        statement,  # noqa: ANN001
-        latitude_from: Decimal,
-        latitude_to: Decimal,
-        longitude_from: Decimal,
-        longitude_to: Decimal,
-    ):
+    def _filter_by_latitude_longitude(statement):  # noqa: ANN205, ANN001
         statement = statement.where(
-            BuildingModel.latitude.between(latitude_from, latitude_to),
-            BuildingModel.longitude.between(longitude_from, longitude_to),
+            OrganisationSearchModel.latitude.between(bindparam("latitude_from"), bindparam("latitude_to")),
+            OrganisationSearchModel.longitude.between(bindparam("longitude_from"), bindparam("longitude_to")),
         )
         return statement
 
-    async def get_list(
-        self, session: AsyncSession, data_filter: OrganisationFilterModel, paginator: PaginatorModel
-    ) -> PaginatedResponseModel[OrganisationListResponseModel]:
-        statement = select(OrganisationModel)
-        if data_filter.latitude_from:
-            statement = statement.join(OrganisationAddressModel).join(
-                BuildingModel, OrganisationAddressModel.building_id == BuildingModel.id
+    @staticmethod
+    def _paginate(statement, direction: CursorDirection | None, ranked: bool):  # noqa: ANN205, ANN001
+        limit = bindparam("limit", type_=Integer)
+        if ranked:
+            # the most similar names first, cursors are keyed by name so they cannot follow this order
+            return (
+                statement.order_by(
+                    func.similarity(LOWER_NAME, bindparam("name_query")).desc(),
+                    OrganisationSearchModel.name,
+                    OrganisationSearchModel.id,
+                )
+                .limit(limit)
+                .offset(bindparam("offset", type_=Integer))
             )
-        elif data_filter.building_id:
-            statement = statement.join(OrganisationAddressModel)
 
-        if data_filter.building_id:
-            statement = self._filter_by_building_id(statement=statement, building_id=data_filter.building_id)
+        # (name, id) keeps the order stable for duplicate names and is covered by idx_org_search_name_id
+        if direction is None:
+            return (
+                statement.order_by(OrganisationSearchModel.name, OrganisationSearchModel.id)
+                .limit(limit)
+                .offset(bindparam("offset", type_=Integer))
+            )
+
+        sort_key = tuple_(OrganisationSearchModel.name, OrganisationSearchModel.id)
+        cursor_key = tuple_(bindparam("cursor_name", type_=String), bindparam("cursor_id", type_=BigInteger))
+        if direction == CursorDirection.NEXT:
+            statement = statement.where(sort_key > cursor_key).order_by(
+                OrganisationSearchModel.name, OrganisationSearchModel.id
+            )
+        else:
+            statement = statement.where(sort_key < cursor_key).order_by(
+                OrganisationSearchModel.name.desc(), OrganisationSearchModel.id.desc()
+            )
+        return statement.limit(limit)
+
+    @staticmethod
+    def _make_cursor(name: str, _id: int, direction: CursorDirection) -> str:
+        return CursorModel(direction=direction, name=name, id=_id).encode()
+
+    @staticmethod
+    def _filter_variant(data_filter: OrganisationFilterModel) -> FilterVariant:
+        return (
+            bool(data_filter.building_id),
+            bool(data_filter.latitude_from),
+            bool(data_filter.activity_id),
+            data_filter.search_mode if data_filter.name else None,
+        )
 
+    @staticmethod
+    def _filter_params(data_filter: OrganisationFilterModel) -> dict:
+        params = {}
+        if data_filter.building_id:
+            params["building_id"] = data_filter.building_id
         if data_filter.latitude_from:
-            statement = self._filter_by_latitude_longitude(
-                statement=statement,
+            params.update(
                 latitude_from=data_filter.latitude_from,
                 latitude_to=data_filter.latitude_to,
                 longitude_from=data_filter.longitude_from,
                 longitude_to=data_filter.longitude_to,
             )
-
         if data_filter.activity_id:
-            statement = self._filter_by_activity_id(statement=statement, activity_id=data_filter.activity_id)
+            params["activity_id"] = data_filter.activity_id
+        if data_filter.name and data_filter.search_mode == OrganisationSearchMode.FUZZY:
+            params["name_query"] = data_filter.name.lower()
+        elif data_filter.name:
+            params["name_pattern"] = f"%{data_filter.name.lower().translate(LIKE_ESCAPE)}%"
+        return params
+
+    @staticmethod
+    def _activity_known(params: dict) -> bool:
+        # nothing can match an activity that does not exist, no need to ask the database
+        return "activity_id" not in params or get_activity_tree().known(params["activity_id"])
+
+    def _apply_filters(self, statement, variant: FilterVariant):  # noqa: ANN202, ANN001
+        # every filter is a column of organisation_search, no joins
+        by_building, by_bbox, by_activity, search_mode = variant
+        if by_building:
+            statement = self._filter_by_building_id(statement=statement)
+
+        if by_bbox:
+            statement = self._filter_by_latitude_longitude(statement=statement)
+
+        if by_activity:
+            statement = self._filter_by_activity_id(statement=statement)
+
+        # both forms are served by idx_org_search_name_lower_trgm
+        if search_mode == OrganisationSearchMode.SUBSTRING:
+            statement = statement.where(LOWER_NAME.like(bindparam("name_pattern")))
+        elif search_mode == OrganisationSearchMode.FUZZY:
+            statement = statement.where(LOWER_NAME.op("%")(bindparam("name_query")))
+
+        return statement
+
+    def _list_statement(self, variant: FilterVariant, direction: CursorDirection | None) -> Select:
+        statement = self._list_statements.get((variant, direction))
+        if statement is None:
+            statement = self._apply_filters(
+                statement=select(*LIST_COLUMNS),
+                variant=variant,
+            )
+            ranked = variant[3] == OrganisationSearchMode.FUZZY
+            statement = self._list_statements[variant, direction] = self._paginate(statement, direction, ranked)
+        return statement
+
+    def _export_statement(self, variant: FilterVariant) -> Select:
+        statement = self._export_statements.get(variant)
+        if statement is None:
+            statement = self._apply_filters(
+                statement=select(*LIST_COLUMNS),
+                variant=variant,
+            )
+            statement = self._export_statements[variant] = statement.order_by(OrganisationSearchModel.id)
+        return statement
+
+    def _count_statement(self, variant: FilterVariant) -> Select:
+        statement = self._count_statements.get(variant)
+        if statement is None:
+            statement = self._count_statements[variant] = self._apply_filters(
+                statement=select(func.count()).select_from(OrganisationSearchModel), variant=variant
+            )
+        return statement
+
+    def _match_statement(self, variant: FilterVariant) -> Select:
+        statement = self._match_statements.get(variant)
+        if statement is None:
+            statement = self._match_statements[variant] = self._apply_filters(
+                statement=select(OrganisationSearchModel.id), variant=variant
+            )
+        return statement
+
+    def hot_statements(self, filters: Iterable[OrganisationFilterModel]) -> list[tuple[Executable, dict]]:
+        """The statements most requests run, with parameters that return no rows.
+
+        Running them on a fresh connection compiles them and fills its prepared statement cache,
+        LIMIT 0 stops the executor before it reads anything.
+        """
+        statements: list[tuple[Executable, dict]] = [
+            (
+                self._list_statement(self._filter_variant(data_filter), None),
+                {**self._filter_params(data_filter), "limit": 0, "offset": 0},
+            )
+            for data_filter in filters
+        ]
+        statements += [
+            (
+                self._list_statement(self._filter_variant(OrganisationFilterModel()), CursorDirection.NEXT),
+                {"cursor_name": "", "cursor_id": 0, "limit": 0},
+            ),
+            (self._list_version, {}),
+            (self._detail_version, {"organisation_id": 0}),
+            (self._detail_by_id, {"organisation_id": 0}),
+            (self._autocomplete_statement, {"prefix_from": "", "prefix_to": "", "limit": 0}),
+        ]
+        return statements
+
+    def search_statements(self, name: str) -> dict[str, tuple[Executable, dict, str]]:
+        """The name search statements for ``name`` with their parameters and the index each one is built for."""
+        checks = {}
+        for mode in OrganisationSearchMode:
+            data_filter = OrganisationFilterModel(name=name, search_mode=mode)
+            checks[mode.value] = (
+                self._list_statement(self._filter_variant(data_filter), None),
+                {**self._filter_params(data_filter), "limit": 11, "offset": 0},
+                "idx_org_search_name_lower_trgm",
+            )
+        prefix = name.lower()
+        checks["autocomplete"] = (
+            self._autocomplete_statement,
+            {"prefix_from": prefix, "prefix_to": prefix_upper_bound(prefix), "limit": 10},
+            "idx_org_search_name_lower_prefix",
+        )
+        return checks
+
+    async def _get_total(
+        self, session: AsyncSession, variant: FilterVariant, params: dict, mode: CountMode, seen: int
+    ) -> tuple[int, bool]:
+        """Total of matching organisations and whether it is an estimate.
+
+        A count cached for the same filter is used by every mode. Otherwise ``estimated``
+        asks the planner, ``auto`` counts only when the planner expects at most
+        ``count_exact_threshold`` rows, and ``exact`` always counts. ``seen`` is the lower
+        bound known from the page itself.
+        """
+        if not self._activity_known(params):
+            return 0, False
+
+        key = (variant, tuple(sorted(params.items())))
+        total = self.count_cache.get(key)
+        if total is not None:
+            return total, False
+
+        if mode != CountMode.EXACT:
+            estimate = await estimate_rows(session, self._match_statement(variant), params)
+            if mode == CountMode.ESTIMATED or estimate > self.count_exact_threshold:
+                return max(estimate, seen), True
+
+        generation = self.count_cache.generation
+        total = (await session.execute(self._count_statement(variant), params)).scalar_one()
+        self.count_cache.set(key, total, tags=(), generation=generation)
+        return total, False
+
+    async def get_list_etag(
+        self, session: AsyncSession, data_filter: OrganisationFilterModel, paginator: PaginatorModel
+    ) -> str:
+        """ETag of a list page, from the organisation_search version of the database ``session`` reads.
+
+        Read before the page in the same session, so a page is never tagged with a newer version than
+        its rows, and every process tags the same page state alike.
+        """
+        version = (await session.execute(self._list_version)).scalar_one()
+        query = (data_filter.model_dump(mode="json"), paginator.model_dump(mode="json"))
+        return make_etag("organisations", version, query)
+
+    async def get_list_json(
+        self, session: AsyncSession, data_filter: OrganisationFilterModel, paginator: PaginatorModel
+    ) -> bytes:
+        """Serialize a PaginatedResponseModel[OrganisationListResponseModel] page straight from the row tuples."""
+        cursor = CursorModel.decode(paginator.cursor) if paginator.cursor else None
+        variant = self._filter_variant(data_filter)
+        ranked = variant[3] == OrganisationSearchMode.FUZZY
+        if cursor and ranked:
+            raise CustomValidationError(msg="cursor is not supported with fuzzy search.")
+        statement = self._list_statement(variant, cursor.direction if cursor else None)
+        filter_params = self._filter_params(data_filter)
+        offset = (paginator.page - 1) * paginator.size if cursor is None else 0
+        params = {**filter_params, "limit": paginator.size + 1}
+        if cursor is None:
+            params["offset"] = offset
+        else:
+            params.update(cursor_name=cursor.name, cursor_id=cursor.id)
 
-        if data_filter.name:
-            statement = statement.where(func.lower(OrganisationModel.name).like(f"%{data_filter.name.lower()}%"))
+        rows = list((await session.execute(statement, params)).tuples().all()) if self._activity_known(params) else []
+        has_more = len(rows) > paginator.size
+        rows = rows[: paginator.size]
+        backward = cursor is not None and cursor.direction == CursorDirection.PREV
+        if backward:
+            rows.reverse()
 
-        statement = (
-            statement.order_by(OrganisationModel.name)
-            .limit(paginator.size)
-            .offset((paginator.page - 1) * paginator.size)
+        next_cursor = prev_cursor = None
+        if rows and not ranked:
+            if has_more or backward:
+                next_cursor = self._make_cursor(rows[-1][2], rows[-1][0], CursorDirection.NEXT)
+            if (has_more and backward) or (cursor and not backward) or (not cursor and paginator.page > 1):
+                prev_cursor = self._make_cursor(rows[0][2], rows[0][0], CursorDirection.PREV)
+
+        total = total_estimated = None
+        if paginator.count != CountMode.NONE:
+            if cursor is None and not has_more and (rows or offset == 0):
+                # the last page is known to be the last one, the total comes for free
+                total, total_estimated = offset + len(rows), False
+            else:
+                seen = offset + len(rows) + int(has_more)
+                total, total_estimated = await self._get_total(
+                    session, variant=variant, params=filter_params, mode=paginator.count, seen=seen
+                )
+
+        return orjson.dumps(
+            {
+                "page": paginator.page,
+                "size": paginator.size,
+                "cursor": paginator.cursor,
+                "items": [{"id": _id, "type": _type, "name": name} for _id, _type, name in rows],
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor,
+                "count": paginator.count,
+                "has_more": bool(rows) if backward else has_more,
+                "total": total,
+                "total_estimated": total_estimated,
+            }
         )
 
-        result = (await session.execute(statement)).scalars().all()
-        return PaginatedResponseModel(
-            page=paginator.page,
-            size=paginator.size,
-            items=[OrganisationListResponseModel(**elm.model_dump()) for elm in result],
+    async def get_list_page(
+        self, session: AsyncSession, data_filter: OrganisationFilterModel, paginator: PaginatorModel
+    ) -> tuple[str, bytes]:
+        """``get_list_json`` with its ETag."""
+        etag = await self.get_list_etag(session, data_filter=data_filter, paginator=paginator)
+        return etag, await self.get_list_json(session, data_filter=data_filter, paginator=paginator)
+
+    async def get_list_page_shared(
+        self, data_filter: OrganisationFilterModel, paginator: PaginatorModel
+    ) -> tuple[str, bytes]:
+        """``get_list_page`` shared by concurrent calls for the same page.
+
+        A change seen meanwhile bumps the catalogue version, later calls start a fresh read.
+        """
+        key = (
+            "list",
+            self.catalogue_version.value,
+            data_filter.model_dump_json(),
+            paginator.model_dump_json(),
+        )
+        return await self.single_flight.do(
+            key,
+            partial(
+                self._in_own_session,
+                get_read_router().session,
+                self.get_list_page,
+                data_filter=data_filter,
+                paginator=paginator,
+            ),
         )
 
     @staticmethod
-    async def get_detail(session: AsyncSession, organisation_id: int) -> OrganisationDetailResponseModel:
-        statement = (
-            select(OrganisationModel)
-            .options(
-                selectinload(OrganisationModel.phones),
-                selectinload(OrganisationModel.activities),
-                joinedload(OrganisationModel.address)
-                .joinedload(OrganisationAddressModel.building)
-                .joinedload(BuildingModel.street)
-                .joinedload(StreetModel.city),
-            )
-            .where(OrganisationModel.id == organisation_id)
+    async def _in_own_session[V](
+        open_session: Callable[[], AbstractAsyncContextManager[AsyncSession]],
+        method: Callable[..., Awaitable[V]],
+        **kwargs: object,
+    ) -> V:
+        # the read is shared, it must not depend on the session of the request that happened to start it
+        async with open_session() as session:
+            return await method(session=session, **kwargs)
+
+    @staticmethod
+    def _detail_statement():  # noqa: ANN205
+        return select(OrganisationModel).options(
+            selectinload(OrganisationModel.phones),
+            selectinload(OrganisationModel.activities),
+            joinedload(OrganisationModel.address)
+            .joinedload(OrganisationAddressModel.building)
+            .joinedload(BuildingModel.street)
+            .joinedload(StreetModel.city),
         )
-        result = (await session.execute(statement)).scalar_one_or_none()
+
+    async def _load_detail(self, session: AsyncSession, organisation_id: int) -> OrganisationModel:
+        result = (await session.execute(self._detail_by_id, {"organisation_id": organisation_id})).scalar_one_or_none()
 
         if not result:
             raise OrganisationNotFoundError(name="Organisation", _id=organisation_id)
 
+        return result
+
+    @staticmethod
+    def _to_detail(result: OrganisationModel) -> OrganisationDetailResponseModel:
         phones = [PhoneResponseModel(phone=phone.phone) for phone in result.phones]
         activities = [ActivityResponseModel(id=activity.activity_id) for activity in result.activities]
         return OrganisationDetailResponseModel(
@@ -129,12 +481,170 @@ class OrganisationsService:
             activities=activities,
         )
 
+    @staticmethod
+    def _detail_etag(organisation_id: int, versions: tuple[datetime, ...]) -> str:
+        return make_etag("organisation", organisation_id, *(version.isoformat() for version in versions))
+
+    def _detail_etag_of(self, result: OrganisationModel) -> str:
+        building = result.address.building
+        versions = (
+            result.updated_at,
+            result.address.updated_at,
+            building.updated_at,
+            building.street.updated_at,
+            building.street.city.updated_at,
+        )
+        return self._detail_etag(result.id, versions)
+
+    @staticmethod
+    def _detail_tags(result: OrganisationModel) -> tuple[str, ...]:
+        # must match the payloads sent by the notify_organisation_changed() triggers
+        building = result.address.building
+        return (
+            f"organisation:{result.id}",
+            f"organisation_address:{result.address_id}",
+            f"building:{building.id}",
+            f"street:{building.street_id}",
+            f"city:{building.street.city_id}",
+        )
+
+    async def export_ndjson(self, data_filter: OrganisationFilterModel, chunk_size: int) -> AsyncIterator[bytes]:
+        """Yield NDJSON chunks of ``chunk_size`` organisations read through a server-side cursor."""
+        statement = self._export_statement(self._filter_variant(data_filter))
+        params = self._filter_params(data_filter)
+
+        if not self._activity_known(params):
+            return
+
+        # the session must outlive the request handler, so it is owned by the generator itself
+        async with get_read_router().session() as session:
+            result = await session.stream(statement, params, execution_options={"yield_per": chunk_size})
+            async for rows in result.partitions():
+                yield b"".join(orjson.dumps(row._asdict(), option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+
+    async def get_autocomplete_json(
+        self, session: AsyncSession, data_filter: OrganisationAutocompleteFilterModel
+    ) -> bytes:
+        prefix = data_filter.prefix.lower()
+        params = {"prefix_from": prefix, "prefix_to": prefix_upper_bound(prefix), "limit": data_filter.limit}
+        rows = (await session.execute(self._autocomplete_statement, params)).tuples().all()
+        return orjson.dumps([{"id": _id, "type": _type, "name": name} for _id, _type, name in rows])
+
+    async def get_nearby(
+        self, session: AsyncSession, data_filter: OrganisationNearbyFilterModel
+    ) -> list[OrganisationNearbyResponseModel]:
+        index = get_building_index()
+        latitude, longitude = float(data_filter.latitude), float(data_filter.longitude)
+        limit = data_filter.limit
+        items: list[OrganisationNearbyResponseModel] = []
+        hydrated = 0
+        while True:
+            # buildings may host no organisations, widen the candidate set until the page is full
+            if data_filter.radius:
+                candidates = index.within(latitude, longitude, data_filter.radius, limit)
+            else:
+                candidates = index.nearest(latitude, longitude, limit)
+            distances = {building_id: distance for distance, building_id in candidates[hydrated:]}
+            if not distances:
+                break
+
+            rows = (await session.execute(self._nearby_statement, {"building_ids": list(distances)})).tuples().all()
+            items.extend(
+                OrganisationNearbyResponseModel(
+                    id=_id, type=_type, name=name, building_id=building_id, distance=distances[building_id]
+                )
+                for _id, _type, name, building_id in rows
+            )
+            hydrated = len(candidates)
+            if len(items) >= data_filter.limit or len(candidates) < limit:
+                break
+            limit *= 2
+
+        items.sort(key=lambda item: (item.distance, item.id))
+        return items[: data_filter.limit]
+
+    async def get_detail_etag(self, session: AsyncSession, organisation_id: int) -> str:
+        """ETag of the organisation detail, without loading the detail itself."""
+        cached = self.detail_cache.get(organisation_id)
+        if cached is not None:
+            return cached[0]
+
+        versions = (await session.execute(self._detail_version, {"organisation_id": organisation_id})).one_or_none()
+        if versions is None:
+            raise OrganisationNotFoundError(name="Organisation", _id=organisation_id)
+
+        return self._detail_etag(organisation_id, tuple(versions))
+
+    async def get_detail_json(self, session: AsyncSession, organisation_id: int) -> tuple[str, CachedBody]:
+        """ETag and serialized OrganisationDetailResponseModel, encoded variants are cached along with it."""
+        cached = self.detail_cache.get(organisation_id)
+        if cached is not None:
+            return cached
+
+        return await self._build_detail_json(session=session, organisation_id=organisation_id)
+
+    async def _build_detail_json(self, session: AsyncSession, organisation_id: int) -> tuple[str, CachedBody]:
+        generation = self.detail_cache.generation
+        result = await self._load_detail(session=session, organisation_id=organisation_id)
+        cached = self._detail_etag_of(result), CachedBody(orjson.dumps(self._to_detail(result).model_dump(mode="json")))
+        self.detail_cache.set(organisation_id, cached, tags=self._detail_tags(result), generation=generation)
+        return cached
+
+    async def get_detail_json_shared(self, organisation_id: int) -> tuple[str, CachedBody]:
+        """``get_detail_json`` shared by concurrent calls for the same organisation."""
+        cached = self.detail_cache.get(organisation_id)
+        if cached is not None:
+            return cached
+
+        # an invalidation bumps the generation, calls after it do not join a read started before it
+        key = ("detail", self.detail_cache.generation, organisation_id)
+        # the primary, a lagging replica would put the state before the invalidation back into the cache
+        return await self.single_flight.do(
+            key,
+            partial(
+                self._in_own_session, get_session_factory(), self._build_detail_json, organisation_id=organisation_id
+            ),
+        )
+
+    async def get_detail_batch_json(self, session: AsyncSession, organisation_ids: list[int]) -> bytes:
+        organisation_ids = list(dict.fromkeys(organisation_ids))
+        payloads = {
+            _id: cached[1].content if (cached := self.detail_cache.get(_id)) else None for _id in organisation_ids
+        }
+        misses = [_id for _id, payload in payloads.items() if payload is None]
+
+        if misses:
+            # one joined query plus one selectin query per collection, whatever the batch size
+            generation = self.detail_cache.generation
+            rows = await session.execute(self._detail_by_ids, {"organisation_ids": misses})
+            for result in rows.scalars().all():
+                payload = orjson.dumps(self._to_detail(result).model_dump(mode="json"))
+                self.detail_cache.set(
+                    result.id,
+                    (self._detail_etag_of(result), CachedBody(payload)),
+                    tags=self._detail_tags(result),
+                    generation=generation,
+                )
+                payloads[result.id] = payload
+
+        items = [payload for payload in payloads.values() if payload is not None]
+        missing = [_id for _id, payload in payloads.items() if payload is None]
+        return b'{"items":[' + b",".join(items) + b'],"missing":' + orjson.dumps(missing) + b"}"
+
 
 @lru_cache
 def get_organisations_service() -> OrganisationsService:
-    return OrganisationsService()
+    settings = get_settings()
+    return OrganisationsService(
+        detail_cache=get_detail_cache(),
+        count_cache=get_count_cache(),
+        catalogue_version=get_catalogue_version(),
+        single_flight=get_single_flight(),
+        count_exact_threshold=settings.COUNT_EXACT_THRESHOLD,
+    )
 
 
 __all__ = [
+    "ORGANISATION_CHANNEL",
     "get_organisations_service",
 ]
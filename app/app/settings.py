@@ -15,6 +15,12 @@ class PGSettings(BaseSettings):
     POOL_MAX_OVERFLOW: int = 30
     POOL_TIMEOUT: int = 30
     POOL_RECYCLE: int = 240
+    QUERY_CACHE_SIZE: int = 1000
+    PREPARED_STATEMENT_CACHE_SIZE: int = 500
+    LISTENER_RECONNECT_DELAY: float = 1.0
+    REPLICAS: list[str] = []
+    REPLICA_MAX_LAG: float = 5.0
+    REPLICA_CHECK_INTERVAL: float = 2.0
 
     model_config = SettingsConfigDict(env_prefix="PG_")
 
@@ -23,6 +29,11 @@ class PGSettings(BaseSettings):
     def db_url(self) -> str:
         return f"postgresql+asyncpg://{self.USER}:{self.PASSWORD}@{self.HOST}:{self.PORT}/{self.NAME}"
 
+    @computed_field
+    @property
+    def dsn(self) -> str:
+        return f"postgresql://{self.USER}:{self.PASSWORD}@{self.HOST}:{self.PORT}/{self.NAME}"
+
 
 LogLevel = Annotated[
     Literal["debug", "info", "warning", "error", "critical", "trace"],
@@ -33,10 +44,44 @@ LogLevel = Annotated[
 class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    WORKERS: int = 1
+    WORKER_MAX_REQUESTS: int = 0
+    WORKER_MAX_REQUESTS_JITTER: int = 0
+    WORKER_MAX_RSS_MB: int = 0
+    WORKER_GRACEFUL_TIMEOUT: int = 30
+    METRICS_PORT: int = 9000
     API_VERSION: str = "v1"
     LOG_LEVEL: LogLevel = "info"
     REQUEST_SEMAPHORE: int = 450
+    LIMITER_INITIAL: int = 450
+    LIMITER_MIN: int = 10
+    LIMITER_MAX_QUEUE: int = 1000
+    LIMITER_QUEUE_TIMEOUT: float = 1.0
+    LIMITER_RETRY_AFTER: int = 1
+    LIMITER_LATENCY_TOLERANCE: float = 2.0
     API_AUTH_KEY: str = "0000"
+    API_AUTH_KEYS: list[str] = []
+    API_WRITE_KEYS: list[str] = []
+    DETAIL_CACHE_SIZE: int = 10000
+    DETAIL_CACHE_TTL: float = 300
+    COUNT_CACHE_SIZE: int = 1000
+    COUNT_CACHE_TTL: float = 60
+    COUNT_CACHE_CLEAR_DELAY: float = 0.1
+    COUNT_EXACT_THRESHOLD: int = 10000
+    GEO_INDEX_CELL_DEG: float = 0.01
+    EXPORT_CHUNK_SIZE: int = 1000
+    INGEST_BATCH_SIZE: int = 5000
+    INGEST_CONCURRENCY: int = 1
+    LOOP_LAG_INTERVAL: float = 0.5
+    REQUEST_STATS_SAMPLE_RATE: float = 0.01
+    COMPRESSION_MIN_SIZE: int = 1000
+    COMPRESSION_OFFLOAD_SIZE: int = 16384
+    COMPRESSION_THREADS: int = 4
+    COMPRESSION_GZIP_LEVEL: int = 5
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    READY_TIMEOUT: float = 1.0
+    READY_MAX_POOL_USAGE: float = 0.9
 
     PG: PGSettings = PGSettings()
 
@@ -0,0 +1,206 @@
+import logging
+import os
+import signal
+import sys
+import time
+from math import ceil
+from multiprocessing import get_context
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+from socket import create_server, socket
+from types import FrameType
+
+import uvicorn
+from fastapi import FastAPI
+from starlette import status
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.metrics import get_metrics_registry
+from app.settings import Settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# how often the master looks at the workers' memory
+CHECK_INTERVAL = 1.0
+# pause before replacing a worker that failed, so a broken startup does not spin
+RESPAWN_DELAY = 1.0
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+STARTUP_FAILURE = 3
+
+
+def _rss(pid: int) -> int | None:
+    try:
+        return int(Path(f"/proc/{pid}/statm").read_text().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def share_pool(settings: Settings, workers: int) -> None:
+    """Split the connection pool budget of PGSettings between the workers."""
+    settings.PG = settings.PG.model_copy(
+        update={
+            "POOL_MINSIZE": ceil(settings.PG.POOL_MINSIZE / workers),
+            "POOL_MAX_OVERFLOW": ceil(settings.PG.POOL_MAX_OVERFLOW / workers),
+        }
+    )
+
+
+class MetricsOnly:
+    """Serve only ``/metrics`` on ``port``, the app as is on every other socket."""
+
+    def __init__(self, app: ASGIApp, port: int) -> None:
+        self.app = app
+        self.port = port
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        server = scope.get("server")
+        if scope["type"] == "http" and server and server[1] == self.port and scope["path"] != "/metrics":
+            response = PlainTextResponse("Not Found", status_code=status.HTTP_404_NOT_FOUND)
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+
+def _serve(config: uvicorn.Config, sockets: list[socket], slot: int, metrics_socket: socket | None) -> None:
+    # the master's handlers are inherited by fork, uvicorn installs its own while serving
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if metrics_socket is not None:
+        # the shared socket hands a scrape to any worker, this one always reaches this worker
+        get_metrics_registry().set_labels(worker=str(slot))
+        config.app = MetricsOnly(config.app, metrics_socket.getsockname()[1])
+        sockets = [*sockets, metrics_socket]
+    server = uvicorn.Server(config)
+    server.run(sockets=sockets)
+    if not server.started:
+        sys.exit(STARTUP_FAILURE)
+
+
+class Supervisor:
+    """Preforking server for ``config.app``.
+
+    The app is imported once in the master and workers are forked from it, sharing its
+    listening socket. Everything that opens connections or starts tasks is created by the
+    app lifespan, so every worker gets its own engine, pool and listener, and is warmed up
+    before its server starts accepting. uvicorn ends a worker by itself after
+    ``limit_max_requests``, the master ends one gracefully once its RSS exceeds
+    ``max_rss``, and every worker that exits is replaced.
+
+    With ``metrics_port`` the worker in slot ``i`` also serves its metrics on
+    ``metrics_port + i``, labelled with ``worker="i"``; a replacement takes over the slot.
+    """
+
+    def __init__(self, config: uvicorn.Config, *, workers: int, max_rss: int | None, metrics_port: int | None) -> None:
+        self.config = config
+        self.workers = workers
+        self.max_rss = max_rss
+        self.metrics_port = metrics_port
+        self._context = get_context("fork")
+        self._processes: list[BaseProcess] = []
+        self._slots: dict[int | None, int] = {}
+        self._metrics_sockets: list[socket] = []
+        self._recycling: set[int] = set()
+        self._should_exit = False
+
+    def run(self) -> None:
+        sockets = [self.config.bind_socket()]
+        if self.metrics_port:
+            self._metrics_sockets = [
+                create_server((self.config.host, self.metrics_port + slot)) for slot in range(self.workers)
+            ]
+        signal.signal(signal.SIGINT, self._handle_exit)
+        signal.signal(signal.SIGTERM, self._handle_exit)
+        logger.info("Started supervisor [%s] with %s workers", os.getpid(), self.workers)
+        for slot in range(self.workers):
+            self._spawn(sockets, slot)
+
+        while not self._should_exit:
+            exited = wait([process.sentinel for process in self._processes], timeout=CHECK_INTERVAL)
+            for process in [process for process in self._processes if process.sentinel in exited]:
+                self._replace(process, sockets)
+            self._check_memory()
+
+        self._shutdown()
+        for sock in [*sockets, *self._metrics_sockets]:
+            sock.close()
+
+    def _spawn(self, sockets: list[socket], slot: int) -> None:
+        metrics_socket = self._metrics_sockets[slot] if self._metrics_sockets else None
+        process = self._context.Process(target=_serve, args=(self.config, sockets, slot, metrics_socket), daemon=False)
+        process.start()
+        self._processes.append(process)
+        self._slots[process.pid] = slot
+        logger.info("Started worker [%s] in slot %s", process.pid, slot)
+
+    def _replace(self, process: BaseProcess, sockets: list[socket]) -> None:
+        process.join()
+        self._processes.remove(process)
+        slot = self._slots.pop(process.pid)
+        recycled = process.pid in self._recycling
+        self._recycling.discard(process.pid)
+        if self._should_exit:
+            return
+
+        if process.exitcode and not recycled:
+            logger.warning("Worker [%s] exited with code %s", process.pid, process.exitcode)
+            time.sleep(RESPAWN_DELAY)
+        else:
+            logger.info("Worker [%s] finished, replacing it", process.pid)
+        self._spawn(sockets, slot)
+
+    def _check_memory(self) -> None:
+        if not self.max_rss:
+            return
+
+        for process in self._processes:
+            rss = _rss(process.pid)
+            if rss is not None and rss > self.max_rss and process.pid not in self._recycling:
+                logger.info("Worker [%s] uses %s MiB, restarting it", process.pid, rss >> 20)
+                self._recycling.add(process.pid)
+                os.kill(process.pid, signal.SIGTERM)
+
+    def _shutdown(self) -> None:
+        for process in self._processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + (self.config.timeout_graceful_shutdown or 30)
+        for process in self._processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Worker [%s] did not stop in time, killing it", process.pid)
+                process.kill()
+                process.join()
+        logger.info("Stopped supervisor [%s]", os.getpid())
+
+    def _handle_exit(self, signum: int, frame: FrameType | None) -> None:  # noqa: ARG002
+        self._should_exit = True
+
+
+def run_workers(app: FastAPI, settings: Settings) -> None:
+    share_pool(settings, settings.WORKERS)
+    config = uvicorn.Config(
+        app,
+        host=settings.HOST,
+        port=settings.PORT,
+        log_level=settings.LOG_LEVEL,
+        limit_max_requests=settings.WORKER_MAX_REQUESTS or None,
+        limit_max_requests_jitter=settings.WORKER_MAX_REQUESTS_JITTER,
+        timeout_graceful_shutdown=settings.WORKER_GRACEFUL_TIMEOUT,
+    )
+    Supervisor(
+        config,
+        workers=settings.WORKERS,
+        max_rss=settings.WORKER_MAX_RSS_MB << 20 or None,
+        metrics_port=settings.METRICS_PORT or None,
+    ).run()
+
+
+__all__ = [
+    "Supervisor",
+    "run_workers",
+    "share_pool",
+]
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.models.common import PaginatorModel
+from app.models.organisations import OrganisationFilterModel, OrganisationSearchMode
+from app.pg import get_pg_engine, get_read_router, prewarm_pool
+from app.service.organisations import get_organisations_service
+from app.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# the list shapes most requests take, running them once pays the first-call cost of the
+# validation and serialization paths before the worker takes traffic
+WARMUP_FILTERS = (
+    OrganisationFilterModel(),
+    OrganisationFilterModel(name="a"),
+    OrganisationFilterModel(name="a", search_mode=OrganisationSearchMode.FUZZY),
+    OrganisationFilterModel(activity_id=1),
+    OrganisationFilterModel(building_id=1),
+)
+
+
+async def prewarm_pools() -> bool:
+    """Open POOL_MINSIZE connections to the primary and every healthy replica and prepare the hot statements.
+
+    Returns whether the primary pool was filled.
+    """
+    size = get_settings().PG.POOL_MINSIZE
+    statements = get_organisations_service().hot_statements(WARMUP_FILTERS)
+    # unreachable replicas would hold the startup for the connect timeout, they get no sessions anyway
+    engines = [get_pg_engine(), *(replica.engine for replica in get_read_router().replicas if replica.healthy)]
+    warmed = await asyncio.gather(*(prewarm_pool(engine, size, statements) for engine in engines))
+    logger.info("Prewarmed %s connections in %s pools", sum(warmed), len(engines))
+    return warmed[0] == size
+
+
+async def warmup() -> bool:
+    """Prewarm the pools and run the hot list queries once, returns whether the worker is warm."""
+    started = time.perf_counter()
+    if not await prewarm_pools():
+        return False
+
+    service = get_organisations_service()
+    try:
+        async with get_read_router().session() as session:
+            for data_filter in WARMUP_FILTERS:
+                await service.get_list_json(session=session, data_filter=data_filter, paginator=PaginatorModel())
+    except (OSError, SQLAlchemyError):
+        logger.exception("Warmup failed, starting cold")
+        return False
+
+    logger.info("Warmed up in %.3fs", time.perf_counter() - started)
+    return True
+
+
+__all__ = [
+    "prewarm_pools",
+    "warmup",
+]
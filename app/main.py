@@ -2,11 +2,12 @@ import uvicorn
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
 
-from app.api import router
+from app.api import metrics_router, router
 from app.handlers import setup_handlers
 from app.lifespan import lifespan
 from app.middlewares import setup_middlewares
 from app.settings import get_settings
+from app.supervisor import run_workers
 
 settings = get_settings()
 app = FastAPI(
@@ -21,8 +22,18 @@ app = FastAPI(
     default_response_class=ORJSONResponse,
 )
 app.include_router(router)
+app.include_router(metrics_router)
 setup_middlewares(app)
 setup_handlers(app)
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host=settings.HOST, port=settings.PORT, log_level=settings.LOG_LEVEL, reload=settings.LOG_LEVEL == "debug")
+    if settings.WORKERS > 1:
+        run_workers(app, settings)
+    else:
+        uvicorn.run(
+            "main:app",
+            host=settings.HOST,
+            port=settings.PORT,
+            log_level=settings.LOG_LEVEL,
+            reload=settings.LOG_LEVEL == "debug",
+        )
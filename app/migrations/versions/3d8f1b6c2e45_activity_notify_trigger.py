@@ -0,0 +1,46 @@
+"""activity notify trigger
+
+Revision ID: 3d8f1b6c2e45
+Revises: 9c4e1a7d3b62
+Create Date: 2026-03-30 09:12:05.318427
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3d8f1b6c2e45"
+down_revision: str | Sequence[str] | None = "9c4e1a7d3b62"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # same as in 5c7e9a13d2b4, dropped by a41f6c0b9e27, the in-process activity tree reloads on it again
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_activity_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('activity_changed', TG_OP);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute("DROP TRIGGER IF EXISTS activity_changed ON activity")
+    op.execute(
+        """
+        CREATE TRIGGER activity_changed
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON activity
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_activity_changed()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS activity_changed ON activity")
+    op.execute("DROP FUNCTION IF EXISTS notify_activity_changed()")
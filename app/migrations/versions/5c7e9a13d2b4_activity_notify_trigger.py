@@ -0,0 +1,44 @@
+"""activity notify trigger
+
+Revision ID: 5c7e9a13d2b4
+Revises: 8b1d4e2f7a90
+Create Date: 2026-03-04 15:02:41.730218
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5c7e9a13d2b4"
+down_revision: str | Sequence[str] | None = "8b1d4e2f7a90"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_activity_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('activity_changed', TG_OP);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER activity_changed
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON activity
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_activity_changed()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS activity_changed ON activity")
+    op.execute("DROP FUNCTION IF EXISTS notify_activity_changed()")
@@ -0,0 +1,79 @@
+"""organisation search version
+
+Revision ID: 6a2f9d4c8e17
+Revises: 3d8f1b6c2e45
+Create Date: 2026-04-02 14:37:20.506113
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "6a2f9d4c8e17"
+down_revision: str | Sequence[str] | None = "3d8f1b6c2e45"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # a single row, list ETags are built from it
+    op.create_table(
+        "organisation_search_version",
+        sa.Column("id", sa.Boolean(), server_default=sa.true(), nullable=False),
+        sa.Column("value", sa.BigInteger(), server_default="0", nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.CheckConstraint("id", name="organisation_search_version_single_row"),
+    )
+    op.execute("INSERT INTO organisation_search_version DEFAULT VALUES")
+    # once per transaction and only at commit: the row lock is held for the commit alone, so writers
+    # do not queue on it for their whole transaction and cannot deadlock over it
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION bump_organisation_search_version() RETURNS trigger AS $$
+        BEGIN
+            IF current_setting('app.organisation_search_bumped', true) IS DISTINCT FROM 'on' THEN
+                PERFORM set_config('app.organisation_search_bumped', 'on', true);
+                UPDATE organisation_search_version SET value = value + 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE CONSTRAINT TRIGGER organisation_search_inserted_or_deleted
+        AFTER INSERT OR DELETE ON organisation_search
+        DEFERRABLE INITIALLY DEFERRED
+        FOR EACH ROW EXECUTE FUNCTION bump_organisation_search_version()
+        """
+    )
+    op.execute(
+        """
+        CREATE CONSTRAINT TRIGGER organisation_search_updated
+        AFTER UPDATE ON organisation_search
+        DEFERRABLE INITIALLY DEFERRED
+        FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*) EXECUTE FUNCTION bump_organisation_search_version()
+        """
+    )
+    # rebuild_organisation_search() truncates, constraint triggers cannot fire on it
+    op.execute(
+        """
+        CREATE TRIGGER organisation_search_truncated
+        AFTER TRUNCATE ON organisation_search
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_organisation_search_version()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS organisation_search_truncated ON organisation_search")
+    op.execute("DROP TRIGGER IF EXISTS organisation_search_updated ON organisation_search")
+    op.execute("DROP TRIGGER IF EXISTS organisation_search_inserted_or_deleted ON organisation_search")
+    op.execute("DROP FUNCTION IF EXISTS bump_organisation_search_version()")
+    op.drop_table("organisation_search_version")
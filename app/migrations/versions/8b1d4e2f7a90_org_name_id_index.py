@@ -0,0 +1,27 @@
+"""org name id index
+
+Revision ID: 8b1d4e2f7a90
+Revises: 3fed549b4455
+Create Date: 2026-03-02 11:24:08.417652
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8b1d4e2f7a90"
+down_revision: str | Sequence[str] | None = "3fed549b4455"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("idx_org_name_id", "organisation", ["name", "id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("idx_org_name_id", table_name="organisation")
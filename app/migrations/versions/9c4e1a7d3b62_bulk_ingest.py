@@ -0,0 +1,66 @@
+"""bulk ingest
+
+Revision ID: 9c4e1a7d3b62
+Revises: f7b2d8c31a06
+Create Date: 2026-03-27 11:18:36.904215
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9c4e1a7d3b62"
+down_revision: str | Sequence[str] | None = "f7b2d8c31a06"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# same as in f7b2d8c31a06_organisation_search
+SEARCH_TRIGGERS = (
+    ("organisation", "id", "INSERT OR DELETE OR UPDATE OF type, name, address_id"),
+    ("organisation_activity", "organisation_id", "INSERT OR DELETE OR UPDATE OF organisation_id, activity_id"),
+    ("activity_closure", "descendant_id", "INSERT OR DELETE OR UPDATE"),
+    ("organisation_address", "id", "UPDATE OF building_id, office"),
+    ("building", "id", "UPDATE OF name, latitude, longitude"),
+    ("street", "id", "UPDATE OF name"),
+    ("city", "id", "UPDATE OF name"),
+)
+# same as in e5a0c2b7d914_row_versions
+ORGANISATION_CHILD_TABLES = ("phone", "organisation_activity")
+# set locally by bulk ingestion, which refreshes organisation_search and touches organisations once per batch
+NOT_BULK_INGEST = "current_setting('app.bulk_ingest', true) IS DISTINCT FROM 'on'"
+
+
+def _create_triggers(when: str) -> None:
+    for table, column, operations in SEARCH_TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_search_changed ON {table}")
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_search_changed
+            AFTER {operations} ON {table}
+            FOR EACH ROW {when} EXECUTE FUNCTION organisation_search_changed('{column}')
+            """
+        )
+    for table in ORGANISATION_CHILD_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_touch_organisation ON {table}")
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_touch_organisation
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW {when} EXECUTE FUNCTION touch_organisation()
+            """
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # phones are replaced per organisation on ingestion, and loaded per organisation for the detail
+    op.create_index("idx_phone_org", "phone", ["organisation_id", "phone"], unique=False)
+    _create_triggers(when=f"WHEN ({NOT_BULK_INGEST})")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _create_triggers(when="")
+    op.drop_index("idx_phone_org", table_name="phone")
@@ -0,0 +1,141 @@
+"""activity closure
+
+Revision ID: a41f6c0b9e27
+Revises: 5c7e9a13d2b4
+Create Date: 2026-03-06 10:47:19.385104
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a41f6c0b9e27"
+down_revision: str | Sequence[str] | None = "5c7e9a13d2b4"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # restored by 3d8f1b6c2e45, the in-process activity tree is kept alongside the closure table
+    op.execute("DROP TRIGGER IF EXISTS activity_changed ON activity")
+    op.execute("DROP FUNCTION IF EXISTS notify_activity_changed()")
+
+    op.create_table(
+        "activity_closure",
+        sa.Column("ancestor_id", sa.BigInteger(), nullable=False),
+        sa.Column("descendant_id", sa.BigInteger(), nullable=False),
+        sa.Column("depth", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["ancestor_id"], ["activity.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["descendant_id"], ["activity.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("ancestor_id", "descendant_id"),
+    )
+    op.create_index(
+        "idx_activity_closure_descendant", "activity_closure", ["descendant_id", "ancestor_id"], unique=False
+    )
+    op.create_index(
+        "idx_org_activity_activity_org", "organisation_activity", ["activity_id", "organisation_id"], unique=False
+    )
+
+    op.execute(
+        """
+        INSERT INTO activity_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE tree AS (
+            SELECT id AS ancestor_id, id AS descendant_id, 0 AS depth FROM activity
+            UNION ALL
+            SELECT tree.ancestor_id, activity.id, tree.depth + 1
+            FROM tree JOIN activity ON activity.parent_id = tree.descendant_id
+        )
+        SELECT ancestor_id, descendant_id, depth FROM tree
+        """
+    )
+
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION activity_closure_insert() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO activity_closure (ancestor_id, descendant_id, depth)
+            SELECT NEW.id, NEW.id, 0
+            UNION ALL
+            SELECT ancestor_id, NEW.id, depth + 1 FROM activity_closure WHERE descendant_id = NEW.parent_id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION activity_closure_move() RETURNS trigger AS $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM activity_closure WHERE ancestor_id = NEW.id AND descendant_id = NEW.parent_id
+            ) THEN
+                RAISE EXCEPTION 'activity % can not be moved under its own descendant %', NEW.id, NEW.parent_id;
+            END IF;
+
+            -- detach the whole subtree from the old ancestors of the moved node
+            DELETE FROM activity_closure link
+            USING activity_closure subtree, activity_closure ancestors
+            WHERE subtree.ancestor_id = NEW.id
+              AND ancestors.descendant_id = NEW.id
+              AND ancestors.ancestor_id <> NEW.id
+              AND link.ancestor_id = ancestors.ancestor_id
+              AND link.descendant_id = subtree.descendant_id;
+
+            -- attach it under the ancestors of the new parent
+            INSERT INTO activity_closure (ancestor_id, descendant_id, depth)
+            SELECT ancestors.ancestor_id, subtree.descendant_id, ancestors.depth + subtree.depth + 1
+            FROM activity_closure ancestors, activity_closure subtree
+            WHERE ancestors.descendant_id = NEW.parent_id AND subtree.ancestor_id = NEW.id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER activity_closure_insert
+        AFTER INSERT ON activity
+        FOR EACH ROW EXECUTE FUNCTION activity_closure_insert()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER activity_closure_move
+        AFTER UPDATE OF parent_id ON activity
+        FOR EACH ROW WHEN (OLD.parent_id IS DISTINCT FROM NEW.parent_id)
+        EXECUTE FUNCTION activity_closure_move()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS activity_closure_move ON activity")
+    op.execute("DROP TRIGGER IF EXISTS activity_closure_insert ON activity")
+    op.execute("DROP FUNCTION IF EXISTS activity_closure_move()")
+    op.execute("DROP FUNCTION IF EXISTS activity_closure_insert()")
+    op.drop_index("idx_org_activity_activity_org", table_name="organisation_activity")
+    op.drop_index("idx_activity_closure_descendant", table_name="activity_closure")
+    op.drop_table("activity_closure")
+
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_activity_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('activity_changed', TG_OP);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER activity_changed
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON activity
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_activity_changed()
+        """
+    )
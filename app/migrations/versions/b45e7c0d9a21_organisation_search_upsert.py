@@ -0,0 +1,141 @@
+"""organisation search upsert
+
+Revision ID: b45e7c0d9a21
+Revises: 6a2f9d4c8e17
+Create Date: 2026-04-03 10:52:44.178305
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b45e7c0d9a21"
+down_revision: str | Sequence[str] | None = "6a2f9d4c8e17"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+SEARCH_COLUMNS = ("type", "name", "building_id", "latitude", "longitude", "activity_ids", "address")
+
+# organisation_search_source of f7b2d8c31a06, with the activities in a fixed order, so an unchanged
+# organisation builds an equal row
+SOURCE_VIEW = """
+    CREATE OR REPLACE VIEW organisation_search_source AS
+    SELECT
+        o.id,
+        o.type,
+        o.name,
+        a.building_id,
+        b.latitude,
+        b.longitude,
+        ARRAY(
+            SELECT DISTINCT c.ancestor_id
+            FROM organisation_activity oa JOIN activity_closure c ON c.descendant_id = oa.activity_id
+            WHERE oa.organisation_id = o.id
+            ORDER BY c.ancestor_id
+        ) AS activity_ids,
+        concat_ws(', ', ci.name, s.name, b.name, a.office) AS address
+    FROM organisation o
+    JOIN organisation_address a ON a.id = o.address_id
+    JOIN building b ON b.id = a.building_id
+    JOIN street s ON s.id = b.street_id
+    JOIN city ci ON ci.id = s.city_id
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(SOURCE_VIEW)
+    # the same rows as organisation_search_source, aggregated in one pass instead of a subquery per
+    # organisation; tests/test_organisation_search.py checks that both views agree
+    op.execute(
+        """
+        CREATE VIEW organisation_search_bulk_source AS
+        SELECT
+            o.id,
+            o.type,
+            o.name,
+            a.building_id,
+            b.latitude,
+            b.longitude,
+            coalesce(activities.activity_ids, '{}') AS activity_ids,
+            concat_ws(', ', ci.name, s.name, b.name, a.office) AS address
+        FROM organisation o
+        JOIN organisation_address a ON a.id = o.address_id
+        JOIN building b ON b.id = a.building_id
+        JOIN street s ON s.id = b.street_id
+        JOIN city ci ON ci.id = s.city_id
+        LEFT JOIN (
+            SELECT oa.organisation_id, array_agg(DISTINCT c.ancestor_id ORDER BY c.ancestor_id) AS activity_ids
+            FROM organisation_activity oa JOIN activity_closure c ON c.descendant_id = oa.activity_id
+            GROUP BY oa.organisation_id
+        ) activities ON activities.organisation_id = o.id
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION rebuild_organisation_search() RETURNS void AS $$
+            TRUNCATE organisation_search;
+            INSERT INTO organisation_search SELECT * FROM organisation_search_bulk_source;
+        $$ LANGUAGE sql
+        """
+    )
+    # a DELETE and INSERT of the same id by two concurrent transactions failed on the primary key,
+    # the upsert waits for the other one instead; unchanged rows are left alone
+    assignments = ", ".join(f"{column} = excluded.{column}" for column in SEARCH_COLUMNS)
+    current = ", ".join(f"search.{column}" for column in SEARCH_COLUMNS)
+    refreshed = ", ".join(f"excluded.{column}" for column in SEARCH_COLUMNS)
+    op.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION refresh_organisation_search(organisation_ids bigint[]) RETURNS void AS $$
+            INSERT INTO organisation_search AS search
+            SELECT * FROM organisation_search_source WHERE id = ANY(organisation_ids)
+            ON CONFLICT (id) DO UPDATE SET {assignments}
+            WHERE ({current}) IS DISTINCT FROM ({refreshed});
+            DELETE FROM organisation_search
+            WHERE id = ANY(organisation_ids)
+            AND id NOT IN (SELECT id FROM organisation_search_source WHERE id = ANY(organisation_ids));
+        $$ LANGUAGE sql
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION refresh_organisation_search(organisation_ids bigint[]) RETURNS void AS $$
+            DELETE FROM organisation_search WHERE id = ANY(organisation_ids);
+            INSERT INTO organisation_search SELECT * FROM organisation_search_source WHERE id = ANY(organisation_ids);
+        $$ LANGUAGE sql
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION rebuild_organisation_search() RETURNS void AS $$
+            TRUNCATE organisation_search;
+            INSERT INTO organisation_search
+            SELECT
+                o.id,
+                o.type,
+                o.name,
+                a.building_id,
+                b.latitude,
+                b.longitude,
+                coalesce(activities.activity_ids, '{}'),
+                concat_ws(', ', ci.name, s.name, b.name, a.office)
+            FROM organisation o
+            JOIN organisation_address a ON a.id = o.address_id
+            JOIN building b ON b.id = a.building_id
+            JOIN street s ON s.id = b.street_id
+            JOIN city ci ON ci.id = s.city_id
+            LEFT JOIN (
+                SELECT oa.organisation_id, array_agg(DISTINCT c.ancestor_id) AS activity_ids
+                FROM organisation_activity oa JOIN activity_closure c ON c.descendant_id = oa.activity_id
+                GROUP BY oa.organisation_id
+            ) activities ON activities.organisation_id = o.id;
+        $$ LANGUAGE sql
+        """
+    )
+    op.execute("DROP VIEW IF EXISTS organisation_search_bulk_source")
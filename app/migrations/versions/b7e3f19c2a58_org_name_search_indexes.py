@@ -0,0 +1,33 @@
+"""org name search indexes
+
+Revision ID: b7e3f19c2a58
+Revises: f2c85d41a6e3
+Create Date: 2026-03-13 11:04:52.318406
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e3f19c2a58"
+down_revision: str | Sequence[str] | None = "f2c85d41a6e3"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # name search filters on lower(name), which the trigram index on name cannot serve
+    op.execute("DROP INDEX IF EXISTS idx_org_name_trgm")
+    op.execute("CREATE INDEX idx_org_name_lower_trgm ON organisation USING gin (lower(name) gin_trgm_ops)")
+    # C collation keeps the btree order byte-wise, so a prefix turns into a plain range scan
+    op.execute('CREATE INDEX idx_org_name_lower_prefix ON organisation ((lower(name) COLLATE "C"), id)')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS idx_org_name_lower_prefix")
+    op.execute("DROP INDEX IF EXISTS idx_org_name_lower_trgm")
+    op.execute("CREATE INDEX idx_org_name_trgm ON organisation USING gin (name gin_trgm_ops)")
@@ -0,0 +1,75 @@
+"""organisation notify triggers
+
+Revision ID: d93b0e5a18c6
+Revises: a41f6c0b9e27
+Create Date: 2026-03-10 12:15:52.604871
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d93b0e5a18c6"
+down_revision: str | Sequence[str] | None = "a41f6c0b9e27"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# table, payload prefix, key column, row operations
+NOTIFY_TRIGGERS = (
+    ("organisation", "organisation", "id", "UPDATE OR DELETE"),
+    ("phone", "organisation", "organisation_id", "INSERT OR UPDATE OR DELETE"),
+    ("organisation_activity", "organisation", "organisation_id", "INSERT OR UPDATE OR DELETE"),
+    ("organisation_address", "organisation_address", "id", "UPDATE OR DELETE"),
+    ("building", "building", "id", "UPDATE OR DELETE"),
+    ("street", "street", "id", "UPDATE OR DELETE"),
+    ("city", "city", "id", "UPDATE OR DELETE"),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # payload is "<prefix>:<id>" for row changes and "*" for TRUNCATE
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_organisation_changed() RETURNS trigger AS $$
+        BEGIN
+            IF TG_LEVEL = 'STATEMENT' THEN
+                PERFORM pg_notify('organisation_changed', '*');
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM pg_notify('organisation_changed', TG_ARGV[0] || ':' || (to_jsonb(OLD) ->> TG_ARGV[1]));
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM pg_notify('organisation_changed', TG_ARGV[0] || ':' || (to_jsonb(NEW) ->> TG_ARGV[1]));
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table, prefix, column, operations in NOTIFY_TRIGGERS:
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_notify_changed
+            AFTER {operations} ON {table}
+            FOR EACH ROW EXECUTE FUNCTION notify_organisation_changed('{prefix}', '{column}')
+            """
+        )
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_notify_truncated
+            AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_organisation_changed()
+            """
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, *_ in NOTIFY_TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_notify_truncated ON {table}")
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_notify_changed ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS notify_organisation_changed()")
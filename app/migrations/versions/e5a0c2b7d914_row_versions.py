@@ -0,0 +1,86 @@
+"""row versions
+
+Revision ID: e5a0c2b7d914
+Revises: b7e3f19c2a58
+Create Date: 2026-03-21 10:04:51.318226
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e5a0c2b7d914"
+down_revision: str | Sequence[str] | None = "b7e3f19c2a58"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+VERSIONED_TABLES = ("organisation", "organisation_address", "building", "street", "city")
+# child tables without a version of their own, a change bumps the parent organisation
+ORGANISATION_CHILD_TABLES = ("phone", "organisation_activity")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in VERSIONED_TABLES:
+        op.add_column(
+            table,
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        )
+
+    # strictly increasing per row, so two updates within the same transaction or microsecond still differ
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := greatest(clock_timestamp(), OLD.updated_at + interval '1 microsecond');
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION touch_organisation() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE organisation SET updated_at = clock_timestamp() WHERE id = OLD.organisation_id;
+            END IF;
+            IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.organisation_id IS DISTINCT FROM OLD.organisation_id) THEN
+                UPDATE organisation SET updated_at = clock_timestamp() WHERE id = NEW.organisation_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table in VERSIONED_TABLES:
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_touch_updated_at
+            BEFORE UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION touch_updated_at()
+            """
+        )
+    for table in ORGANISATION_CHILD_TABLES:
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_touch_organisation
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION touch_organisation()
+            """
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ORGANISATION_CHILD_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_touch_organisation ON {table}")
+    for table in VERSIONED_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_touch_updated_at ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS touch_organisation()")
+    op.execute("DROP FUNCTION IF EXISTS touch_updated_at()")
+    for table in VERSIONED_TABLES:
+        op.drop_column(table, "updated_at")
@@ -0,0 +1,46 @@
+"""building index support
+
+Revision ID: f2c85d41a6e3
+Revises: d93b0e5a18c6
+Create Date: 2026-03-12 09:38:27.140593
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f2c85d41a6e3"
+down_revision: str | Sequence[str] | None = "d93b0e5a18c6"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("idx_org_address_building", "organisation_address", ["building_id"], unique=False)
+    op.create_index("idx_org_address", "organisation", ["address_id"], unique=False)
+    # the in-process building index also has to learn about new buildings
+    op.execute("DROP TRIGGER IF EXISTS building_notify_changed ON building")
+    op.execute(
+        """
+        CREATE TRIGGER building_notify_changed
+        AFTER INSERT OR UPDATE OR DELETE ON building
+        FOR EACH ROW EXECUTE FUNCTION notify_organisation_changed('building', 'id')
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS building_notify_changed ON building")
+    op.execute(
+        """
+        CREATE TRIGGER building_notify_changed
+        AFTER UPDATE OR DELETE ON building
+        FOR EACH ROW EXECUTE FUNCTION notify_organisation_changed('building', 'id')
+        """
+    )
+    op.drop_index("idx_org_address", table_name="organisation")
+    op.drop_index("idx_org_address_building", table_name="organisation_address")
@@ -0,0 +1,195 @@
+"""organisation search read model
+
+Revision ID: f7b2d8c31a06
+Revises: e5a0c2b7d914
+Create Date: 2026-03-24 15:42:08.503117
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "f7b2d8c31a06"
+down_revision: str | Sequence[str] | None = "e5a0c2b7d914"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# table, key column, row operations that can change a search row
+SEARCH_TRIGGERS = (
+    ("organisation", "id", "INSERT OR DELETE OR UPDATE OF type, name, address_id"),
+    ("organisation_activity", "organisation_id", "INSERT OR DELETE OR UPDATE OF organisation_id, activity_id"),
+    ("activity_closure", "descendant_id", "INSERT OR DELETE OR UPDATE"),
+    ("organisation_address", "id", "UPDATE OF building_id, office"),
+    ("building", "id", "UPDATE OF name, latitude, longitude"),
+    ("street", "id", "UPDATE OF name"),
+    ("city", "id", "UPDATE OF name"),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("idx_org_activity_org", "organisation_activity", ["organisation_id", "activity_id"], unique=False)
+    op.create_table(
+        "organisation_search",
+        sa.Column("id", sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column("type", postgresql.ENUM(name="organisationtypes", create_type=False), nullable=False),
+        sa.Column("name", sqlmodel.sql.sqltypes.AutoString(length=256), nullable=False),
+        sa.Column("building_id", sa.BigInteger(), nullable=False),
+        sa.Column("latitude", sa.Numeric(), nullable=False),
+        sa.Column("longitude", sa.Numeric(), nullable=False),
+        sa.Column("activity_ids", postgresql.ARRAY(sa.BigInteger()), nullable=False),
+        sa.Column("address", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    op.execute(
+        """
+        CREATE VIEW organisation_search_source AS
+        SELECT
+            o.id,
+            o.type,
+            o.name,
+            a.building_id,
+            b.latitude,
+            b.longitude,
+            ARRAY(
+                SELECT DISTINCT c.ancestor_id
+                FROM organisation_activity oa JOIN activity_closure c ON c.descendant_id = oa.activity_id
+                WHERE oa.organisation_id = o.id
+            ) AS activity_ids,
+            concat_ws(', ', ci.name, s.name, b.name, a.office) AS address
+        FROM organisation o
+        JOIN organisation_address a ON a.id = o.address_id
+        JOIN building b ON b.id = a.building_id
+        JOIN street s ON s.id = b.street_id
+        JOIN city ci ON ci.id = s.city_id
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION refresh_organisation_search(organisation_ids bigint[]) RETURNS void AS $$
+            DELETE FROM organisation_search WHERE id = ANY(organisation_ids);
+            INSERT INTO organisation_search SELECT * FROM organisation_search_source WHERE id = ANY(organisation_ids);
+        $$ LANGUAGE sql
+        """
+    )
+    # the rows of organisation_search_source, aggregated in one pass instead of a subquery per organisation
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION rebuild_organisation_search() RETURNS void AS $$
+            TRUNCATE organisation_search;
+            INSERT INTO organisation_search
+            SELECT
+                o.id,
+                o.type,
+                o.name,
+                a.building_id,
+                b.latitude,
+                b.longitude,
+                coalesce(activities.activity_ids, '{}'),
+                concat_ws(', ', ci.name, s.name, b.name, a.office)
+            FROM organisation o
+            JOIN organisation_address a ON a.id = o.address_id
+            JOIN building b ON b.id = a.building_id
+            JOIN street s ON s.id = b.street_id
+            JOIN city ci ON ci.id = s.city_id
+            LEFT JOIN (
+                SELECT oa.organisation_id, array_agg(DISTINCT c.ancestor_id) AS activity_ids
+                FROM organisation_activity oa JOIN activity_closure c ON c.descendant_id = oa.activity_id
+                GROUP BY oa.organisation_id
+            ) activities ON activities.organisation_id = o.id;
+        $$ LANGUAGE sql
+        """
+    )
+    # maps the changed row to the organisations whose search rows are built from it
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION organisation_search_changed() RETURNS trigger AS $$
+        DECLARE
+            keys bigint[] := array_remove(
+                ARRAY[(to_jsonb(OLD) ->> TG_ARGV[0])::bigint, (to_jsonb(NEW) ->> TG_ARGV[0])::bigint], NULL
+            );
+        BEGIN
+            PERFORM refresh_organisation_search(
+                CASE TG_TABLE_NAME
+                    WHEN 'organisation' THEN keys
+                    WHEN 'organisation_activity' THEN keys
+                    WHEN 'activity_closure' THEN ARRAY(
+                        SELECT organisation_id FROM organisation_activity WHERE activity_id = ANY(keys)
+                    )
+                    WHEN 'organisation_address' THEN ARRAY(
+                        SELECT id FROM organisation WHERE address_id = ANY(keys)
+                    )
+                    WHEN 'building' THEN ARRAY(
+                        SELECT o.id
+                        FROM organisation o JOIN organisation_address a ON a.id = o.address_id
+                        WHERE a.building_id = ANY(keys)
+                    )
+                    WHEN 'street' THEN ARRAY(
+                        SELECT o.id
+                        FROM organisation o
+                        JOIN organisation_address a ON a.id = o.address_id
+                        JOIN building b ON b.id = a.building_id
+                        WHERE b.street_id = ANY(keys)
+                    )
+                    WHEN 'city' THEN ARRAY(
+                        SELECT o.id
+                        FROM organisation o
+                        JOIN organisation_address a ON a.id = o.address_id
+                        JOIN building b ON b.id = a.building_id
+                        JOIN street s ON s.id = b.street_id
+                        WHERE s.city_id = ANY(keys)
+                    )
+                END
+            );
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table, column, operations in SEARCH_TRIGGERS:
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_search_changed
+            AFTER {operations} ON {table}
+            FOR EACH ROW EXECUTE FUNCTION organisation_search_changed('{column}')
+            """
+        )
+
+    op.execute("SELECT rebuild_organisation_search()")
+    op.execute(
+        "CREATE INDEX idx_org_search_name_lower_trgm ON organisation_search USING gin (lower(name) gin_trgm_ops)"
+    )
+    op.execute('CREATE INDEX idx_org_search_name_lower_prefix ON organisation_search ((lower(name) COLLATE "C"), id)')
+    op.create_index("idx_org_search_name_id", "organisation_search", ["name", "id"], unique=False)
+    op.create_index(
+        "idx_org_search_activity_ids", "organisation_search", ["activity_ids"], unique=False, postgresql_using="gin"
+    )
+    op.create_index("idx_org_search_building", "organisation_search", ["building_id"], unique=False)
+    op.create_index("idx_org_search_coords", "organisation_search", ["latitude", "longitude"], unique=False)
+
+    # list, count, export and autocomplete read organisation_search now
+    op.execute("DROP INDEX IF EXISTS idx_org_name_lower_trgm")
+    op.execute("DROP INDEX IF EXISTS idx_org_name_lower_prefix")
+    op.drop_index("idx_org_name_id", table_name="organisation")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index("idx_org_name_id", "organisation", ["name", "id"], unique=False)
+    op.execute('CREATE INDEX idx_org_name_lower_prefix ON organisation ((lower(name) COLLATE "C"), id)')
+    op.execute("CREATE INDEX idx_org_name_lower_trgm ON organisation USING gin (lower(name) gin_trgm_ops)")
+
+    for table, *_ in SEARCH_TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_search_changed ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS organisation_search_changed()")
+    op.execute("DROP FUNCTION IF EXISTS rebuild_organisation_search()")
+    op.execute("DROP FUNCTION IF EXISTS refresh_organisation_search(bigint[])")
+    op.execute("DROP VIEW IF EXISTS organisation_search_source")
+    op.drop_table("organisation_search")
+    op.drop_index("idx_org_activity_org", table_name="organisation_activity")
@@ -1,8 +1,15 @@
 import asyncio
+import logging
 import os
 
-from tests.load_fake_data import load_fake_data
+from tests.load_fake_data import FakeDataScale, load_fake_data
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     if os.getenv("LOAD_FAKE_DATA"):
-        asyncio.run(load_fake_data())
+        scale = FakeDataScale.from_factor(
+            factor=float(os.getenv("FAKE_DATA_SCALE", "1")),
+            activity_depth=int(os.getenv("FAKE_DATA_ACTIVITY_DEPTH", "3")),
+        )
+        workers = int(os.getenv("FAKE_DATA_WORKERS", "0")) or None
+        asyncio.run(load_fake_data(scale=scale, workers=workers))
@@ -0,0 +1,317 @@
+"""HTTP benchmark of the organisation endpoints against a local Postgres.
+
+Seeds the database at a fixed scale if it holds fewer organisations, then drives every
+scenario at a fixed concurrency and reports latency percentiles, throughput and DB
+statements per request as JSON. With ``--baseline`` the run fails when a scenario is
+slower, or issues more statements, than the stored baseline allows.
+
+The name search statements are also EXPLAINed with sequential scans disabled, and the
+run fails when one of them does not use its index.
+
+    python -m tests.benchmark --scale 1 --concurrency 32 --requests 2000 --baseline bench.json
+    python -m tests.benchmark --scale 1 --save-baseline bench.json
+"""
+
+import argparse
+import asyncio
+import sys
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from itertools import cycle
+from pathlib import Path
+from statistics import mean, quantiles
+from time import perf_counter
+from urllib.parse import urlencode
+
+import asyncpg
+import httpx
+import orjson
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql.asyncpg import dialect
+
+from app.pg import get_pg_engine
+from app.service.organisations import get_organisations_service
+from app.settings import get_settings
+from tests.load_fake_data import FakeDataScale, load_fake_data
+
+WARMUP_REQUESTS = 20
+
+
+@dataclass(slots=True)
+class Scenario:
+    name: str
+    urls: list[str]
+
+
+@dataclass(slots=True)
+class ScenarioResult:
+    requests: int
+    errors: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_ms: float
+    rps: float
+    queries_per_request: float | None
+
+
+class QueryCounter:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, *_: object) -> None:
+        self.count += 1
+
+
+async def seed(scale: FakeDataScale, dsn: str) -> None:
+    connection = await asyncpg.connect(dsn)
+    try:
+        organisations = await connection.fetchval("SELECT count(*) FROM organisation")
+    finally:
+        await connection.close()
+
+    if organisations < scale.organisations:
+        await load_fake_data(scale=scale)
+
+
+async def build_scenarios(dsn: str, prefix: str, page_size: int) -> list[Scenario]:
+    """Pick filter values from the seeded data in a deterministic way."""
+    connection = await asyncpg.connect(dsn)
+    try:
+        rows = await connection.fetch(
+            """
+            SELECT o.id, o.name, a.building_id, b.latitude, b.longitude
+            FROM organisation o
+            JOIN organisation_address a ON a.id = o.address_id
+            JOIN building b ON b.id = a.building_id
+            WHERE o.id >= (SELECT max(id) / 2 FROM organisation)
+            ORDER BY o.id
+            LIMIT 100
+            """
+        )
+        activity_ids = await connection.fetch("SELECT id FROM activity WHERE parent_id IS NULL ORDER BY id LIMIT 10")
+        total = await connection.fetchval("SELECT count(*) FROM organisation")
+    finally:
+        await connection.close()
+
+    organisations = f"{prefix}/organisations/"
+    deep_page = max(1, total // page_size // 2)
+
+    def url(**params: object) -> str:
+        return f"{organisations}?{urlencode({'size': page_size, **params})}"
+
+    return [
+        Scenario("list", [url()]),
+        Scenario("list_count", [url(count="auto", name=row["name"][:4]) for row in rows]),
+        Scenario("list_name", [url(name=row["name"][:4]) for row in rows]),
+        Scenario("list_fuzzy", [url(name=row["name"][:6], search_mode="fuzzy") for row in rows]),
+        Scenario(
+            "autocomplete", [f"{organisations}autocomplete/?{urlencode({'prefix': row['name'][:3]})}" for row in rows]
+        ),
+        Scenario("list_activity", [url(activity_id=row["id"]) for row in activity_ids]),
+        Scenario("list_building", [url(building_id=row["building_id"]) for row in rows]),
+        Scenario(
+            "list_bbox",
+            [
+                url(
+                    latitude_from=row["latitude"] - 1,
+                    latitude_to=row["latitude"] + 1,
+                    longitude_from=row["longitude"] - 1,
+                    longitude_to=row["longitude"] + 1,
+                )
+                for row in rows
+            ],
+        ),
+        Scenario("list_deep_page", [url(page=deep_page)]),
+        Scenario("detail", [f"{organisations}{row['id']}/" for row in rows]),
+        # framework overhead: no database work, the detail body comes from the in-process cache
+        Scenario("ping", [f"{prefix}/ping/"]),
+        Scenario("detail_cached", [f"{organisations}{rows[0]['id']}/"]),
+    ]
+
+
+def _plan_indexes(plan: dict) -> set[str]:
+    indexes = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", ()):
+        indexes |= _plan_indexes(child)
+    return indexes
+
+
+async def explain_search(connection: asyncpg.Connection, name: str) -> dict[str, dict]:
+    """Check that every name search statement of the service can use its index."""
+    # with a small table the planner rightly prefers a sequential scan, the check is whether the index applies
+    await connection.execute("SET enable_seqscan = off")
+    try:
+        results = {}
+        for check, (statement, params, index) in get_organisations_service().search_statements(name).items():
+            compiled = statement.compile(dialect=dialect())
+            values = compiled.construct_params(params)
+            explained = await connection.fetchval(
+                f"EXPLAIN (FORMAT JSON) {compiled}", *(values[key] for key in compiled.positiontup)
+            )
+            used = _plan_indexes(orjson.loads(explained)[0]["Plan"])
+            results[check] = {"index": index, "used": sorted(used), "ok": index in used}
+    finally:
+        await connection.execute("RESET enable_seqscan")
+    return results
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int, counter: QueryCounter | None
+) -> ScenarioResult:
+    urls = cycle(scenario.urls)
+    for _ in range(WARMUP_REQUESTS):
+        await client.get(next(urls))
+
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+    queries_before = counter.count if counter else 0
+
+    async def worker() -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = perf_counter()
+            response = await client.get(next(urls))
+            latencies.append(perf_counter() - started)
+            if response.status_code != httpx.codes.OK:
+                errors += 1
+
+    started = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = perf_counter() - started
+
+    percentiles = quantiles(latencies, n=100, method="inclusive")
+    return ScenarioResult(
+        requests=len(latencies),
+        errors=errors,
+        p50_ms=round(percentiles[49] * 1000, 3),
+        p95_ms=round(percentiles[94] * 1000, 3),
+        p99_ms=round(percentiles[98] * 1000, 3),
+        mean_ms=round(mean(latencies) * 1000, 3),
+        rps=round(len(latencies) / elapsed, 1),
+        queries_per_request=round((counter.count - queries_before) / len(latencies), 3) if counter else None,
+    )
+
+
+@asynccontextmanager
+async def make_client(url: str | None) -> AsyncIterator[tuple[httpx.AsyncClient, QueryCounter | None]]:
+    headers = {"X-AUTH-KEY": get_settings().API_AUTH_KEY}
+    if url:
+        async with httpx.AsyncClient(base_url=url, headers=headers, timeout=60) as client:
+            yield client, None
+        return
+
+    from main import app  # noqa: PLC0415
+
+    counter = QueryCounter()
+    event.listen(get_pg_engine().sync_engine, "before_cursor_execute", counter)
+    transport = httpx.ASGITransport(app=app)
+    async with (
+        app.router.lifespan_context(app),
+        httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers, timeout=60) as client,
+    ):
+        yield client, counter
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, result in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        if result["errors"]:
+            regressions.append(f"{name}: {result['errors']} failed requests")
+        regressions.extend(
+            f"{name}: {metric} {result[metric]} > baseline {base[metric]}"
+            for metric in ("p50_ms", "p95_ms", "p99_ms")
+            if result[metric] > base[metric] * (1 + tolerance)
+        )
+        if result["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {result['rps']} < baseline {base['rps']}")
+        if (result["queries_per_request"] or 0) > (base["queries_per_request"] or 0):
+            regressions.append(
+                f"{name}: queries_per_request {result['queries_per_request']} > {base['queries_per_request']}"
+            )
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> dict:
+    settings = get_settings()
+    scale = FakeDataScale.from_factor(args.scale)
+    if not args.skip_seed:
+        await seed(scale, settings.PG.dsn)
+
+    prefix = f"/api/{settings.API_VERSION}"
+    scenarios = await build_scenarios(settings.PG.dsn, prefix=prefix, page_size=args.page_size)
+    if args.only:
+        scenarios = [scenario for scenario in scenarios if scenario.name in args.only]
+
+    connection = await asyncpg.connect(settings.PG.dsn)
+    try:
+        name = await connection.fetchval("SELECT left(name, 4) FROM organisation ORDER BY id LIMIT 1")
+        explain = await explain_search(connection, name)
+    finally:
+        await connection.close()
+
+    results = {}
+    async with make_client(args.url) as (client, counter):
+        for scenario in scenarios:
+            results[scenario.name] = asdict(
+                await run_scenario(client, scenario, args.requests, args.concurrency, counter)
+            )
+
+    return {
+        "meta": {
+            "scale": args.scale,
+            "organisations": scale.organisations,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "page_size": args.page_size,
+            "target": args.url or "in-process",
+        },
+        "scenarios": results,
+        "explain": explain,
+    }
+
+
+def main(args: argparse.Namespace) -> int:
+    report = asyncio.run(run(args))
+    output = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+    sys.stdout.write(output.decode() + "\n")
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).write_bytes(output)
+
+    regressions = [
+        f"{check}: {result['index']} is not used, plan has {result['used']}"
+        for check, result in report["explain"].items()
+        if not result["ok"]
+    ]
+    if args.baseline:
+        regressions.extend(compare(report, orjson.loads(Path(args.baseline).read_bytes()), args.tolerance))
+    for regression in regressions:
+        sys.stderr.write(f"REGRESSION {regression}\n")
+    return 1 if regressions else 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1, help="FakeDataScale factor to seed")
+    parser.add_argument("--skip-seed", action="store_true", help="Use the database as is")
+    parser.add_argument("--url", help="Benchmark a running server instead of the app in-process")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per scenario")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--only", nargs="*", help="Scenario names to run")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="Fail on regressions against this JSON report")
+    parser.add_argument("--save-baseline", help="Store the JSON report as a new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -1,104 +1,344 @@
-from contextlib import asynccontextmanager
-from random import choice, randint
+"""Bulk fake data generator for load testing.
 
+Rows are generated in worker processes, each streaming its chunk into Postgres with COPY
+over its own connection. Triggers and FK checks are switched off for the load
+(``session_replication_role = replica``, needs a superuser) and secondary indexes are
+dropped before and rebuilt after it, so filling a local database to production size
+takes minutes instead of hours. The organisation_search read model is rebuilt in one pass
+at the end instead of row by row by its triggers.
+"""
+
+import asyncio
+import logging
+import os
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from functools import lru_cache
+from multiprocessing import get_context
+from random import Random
+from time import perf_counter
+from typing import Self
+
+import asyncpg
 from faker import Faker
 
-from app.models.activities import ActivityModel
-from app.models.buildings import BuildingModel, CityModel, StreetModel
-from app.models.organisations import (
-    OrganisationActivityModel,
-    OrganisationAddressModel,
-    OrganisationModel,
-    OrganisationTypes,
-    PhoneModel,
-)
-from app.pg import AsyncSession, get_session
+from app.models.organisations import OrganisationTypes
+from app.service.activities import ACTIVITY_CHANNEL
+from app.service.organisations import ORGANISATION_CHANNEL
+from app.settings import get_settings
 
+logger = logging.getLogger(__name__)
 
-async def load_activities(session: AsyncSession) -> list[ActivityModel]:
-    fake = Faker()
-    activities = []
-    for _ in range(10):
-        parent = ActivityModel(name=Faker().text(), parent_id=None)
-        session.add(parent)
-        activities.append(parent)
-        await session.flush()
-        for _ in range(3):
-            child_1 = ActivityModel(
-                name=fake.text(),
-                parent_id=parent.id,
-            )
-            session.add(child_1)
-            activities.append(child_1)
-            await session.flush()
-            for _ in range(3):
-                child_2 = ActivityModel(
-                    name=fake.text(),
-                    parent_id=child_1.id,
-                )
-                session.add(child_2)
-                activities.append(child_2)
-    await session.commit()
-    return activities
+COLUMNS = {
+    "activity": ["id", "name", "parent_id"],
+    "activity_closure": ["ancestor_id", "descendant_id", "depth"],
+    "city": ["id", "name"],
+    "street": ["id", "name", "city_id"],
+    "building": ["id", "name", "street_id", "latitude", "longitude"],
+    "organisation_address": ["id", "building_id", "office"],
+    "organisation": ["id", "type", "name", "address_id"],
+    "phone": ["phone", "organisation_id"],
+    "organisation_activity": ["organisation_id", "activity_id"],
+}
+TABLES = tuple(COLUMNS)
+# filled from the loaded tables, not copied
+DERIVED_TABLES = ("organisation_search",)
+SERIAL_TABLES = ("activity", "city", "street", "building", "organisation_address", "organisation")
+POOL_SIZE = 5000
+CITY_RADIUS_DEG = 0.1
 
 
-async def load_buildings(session: AsyncSession) -> list[BuildingModel]:
-    fake = Faker()
-    buildings = []
-    for _ in range(10):
-        city = CityModel(name=fake.city())
-        session.add(city)
-        await session.flush()
-        for _ in range(100):
-            street = StreetModel(name=fake.street_name(), city_id=city.id)
-            session.add(street)
-            await session.flush()
-            for _ in range(20):
-                building = BuildingModel(
-                    name=fake.building_number(),
-                    street_id=street.id,
-                    latitude=fake.latitude(),
-                    longitude=fake.longitude(),
-                )
-                session.add(building)
-                buildings.append(building)
-    await session.commit()
-    return buildings
+@dataclass(frozen=True, slots=True)
+class FakeDataScale:
+    organisations: int
+    buildings: int
+    buildings_per_street: int = 20
+    streets_per_city: int = 100
+    activity_roots: int = 10
+    activity_fanout: int = 3
+    activity_depth: int = 3
+    max_phones: int = 3
+    max_activities: int = 5
+    chunk_size: int = 50_000
 
+    @classmethod
+    def from_factor(cls, factor: float, activity_depth: int = 3) -> Self:
+        """Factor 1 is 10k organisations in 1k buildings, factor 1000 is 10M organisations in 1M buildings."""
+        return cls(
+            organisations=max(1, int(10_000 * factor)),
+            buildings=max(1, int(1_000 * factor)),
+            activity_depth=activity_depth,
+        )
 
-async def load_organisations(
-    session: AsyncSession, activities: list[ActivityModel], buildings: list[BuildingModel]
-) -> None:
+    @property
+    def streets(self) -> int:
+        return -(-self.buildings // self.buildings_per_street)
+
+    @property
+    def cities(self) -> int:
+        return -(-self.streets // self.streets_per_city)
+
+
+@dataclass(frozen=True, slots=True)
+class IdOffsets:
+    """Max ids already in the tables, new rows are appended after them."""
+
+    activity: int
+    city: int
+    street: int
+    building: int
+    organisation_address: int
+    organisation: int
+
+
+@dataclass(frozen=True, slots=True)
+class Chunk:
+    kind: str
+    start: int
+    count: int
+    seed: int
+
+
+@lru_cache
+def _name_pools() -> dict[str, list[str]]:
+    # Faker is far too slow to call per row at this scale, rows are combined from pools instead
     fake = Faker()
-    for _ in range(100):
-        office = OrganisationAddressModel(building_id=choice(buildings).id, office=fake.name())
-        session.add(office)
-        await session.flush()
-        organisation = OrganisationModel(
-            type=choice([ot.value for ot in OrganisationTypes]),
-            name=fake.name(),
-            address_id=office.id,
+    fake.seed_instance(0)
+    return {
+        "first_name": [fake.first_name() for _ in range(POOL_SIZE)],
+        "last_name": [fake.last_name() for _ in range(POOL_SIZE)],
+        "company": [fake.company() for _ in range(POOL_SIZE)],
+        "city": [fake.city() for _ in range(POOL_SIZE)],
+        "street": [fake.street_name() for _ in range(POOL_SIZE)],
+        "word": [fake.word() for _ in range(POOL_SIZE)],
+    }
+
+
+@lru_cache
+def _city_centre(city_id: int) -> tuple[float, float]:
+    rnd = Random(city_id)
+    return rnd.uniform(-60, 70), rnd.uniform(-180, 180)
+
+
+def _activities(scale: FakeDataScale, offsets: IdOffsets) -> tuple[list[tuple], list[tuple], list[int]]:
+    pools = _name_pools()
+    rnd = Random(1)
+    activities: list[tuple] = []
+    closure: list[tuple] = []
+    next_id = offsets.activity + 1
+    level = []
+    for _ in range(scale.activity_roots):
+        activities.append((next_id, " ".join(rnd.sample(pools["word"], 2)).capitalize(), None))
+        closure.append((next_id, next_id, 0))
+        level.append((next_id, [next_id]))
+        next_id += 1
+
+    for _ in range(scale.activity_depth - 1):
+        next_level = []
+        for parent_id, ancestors in level:
+            for _ in range(scale.activity_fanout):
+                activities.append((next_id, " ".join(rnd.sample(pools["word"], 2)).capitalize(), parent_id))
+                path = [*ancestors, next_id]
+                closure.extend((ancestor, next_id, len(path) - 1 - depth) for depth, ancestor in enumerate(path))
+                next_level.append((next_id, path))
+                next_id += 1
+        level = next_level
+
+    return activities, closure, [activity[0] for activity in activities]
+
+
+def _geo_rows(scale: FakeDataScale, offsets: IdOffsets) -> tuple[list[tuple], list[tuple]]:
+    pools = _name_pools()
+    rnd = Random(2)
+    cities = [(offsets.city + i + 1, rnd.choice(pools["city"])) for i in range(scale.cities)]
+    streets = [
+        (offsets.street + i + 1, rnd.choice(pools["street"]), offsets.city + i // scale.streets_per_city + 1)
+        for i in range(scale.streets)
+    ]
+    return cities, streets
+
+
+def _building_rows(scale: FakeDataScale, offsets: IdOffsets, chunk: Chunk) -> Iterator[tuple]:
+    rnd = Random(chunk.seed)
+    for i in range(chunk.start, chunk.start + chunk.count):
+        street_index = i // scale.buildings_per_street
+        city_id = offsets.city + street_index // scale.streets_per_city + 1
+        latitude, longitude = _city_centre(city_id)
+        yield (
+            offsets.building + i + 1,
+            str(rnd.randint(1, 300)),
+            offsets.street + street_index + 1,
+            Decimal(f"{latitude + rnd.uniform(-CITY_RADIUS_DEG, CITY_RADIUS_DEG):.6f}"),
+            Decimal(f"{(longitude + rnd.uniform(-CITY_RADIUS_DEG, CITY_RADIUS_DEG) + 180) % 360 - 180:.6f}"),
         )
-        session.add(organisation)
-        await session.flush()
-        for _ in range(randint(0, 3)):
-            phone = PhoneModel(
-                phone=fake.phone_number()[:14],
-                organisation_id=organisation.id,
-            )
-            session.add(phone)
-        for _ in range(randint(0, 5)):
-            org_activity = OrganisationActivityModel(
-                organisation_id=organisation.id,
-                activity_id=choice(activities).id,
+
+
+def _organisation_rows(
+    scale: FakeDataScale, offsets: IdOffsets, chunk: Chunk, activity_ids: list[int]
+) -> dict[str, list[tuple]]:
+    pools = _name_pools()
+    rnd = Random(chunk.seed)
+    types = [organisation_type.value for organisation_type in OrganisationTypes]
+    rows: dict[str, list[tuple]] = {
+        "organisation_address": [],
+        "organisation": [],
+        "phone": [],
+        "organisation_activity": [],
+    }
+    for i in range(chunk.start, chunk.start + chunk.count):
+        organisation_id = offsets.organisation + i + 1
+        address_id = offsets.organisation_address + i + 1
+        building_id = offsets.building + rnd.randrange(scale.buildings) + 1
+        rows["organisation_address"].append((address_id, building_id, f"office {rnd.randint(1, 999)}"))
+        if rnd.random() < 0.5:  # noqa: PLR2004
+            name = f"{rnd.choice(pools['company'])} {rnd.choice(pools['word'])}"
+        else:
+            name = f"{rnd.choice(pools['first_name'])} {rnd.choice(pools['last_name'])}"
+        rows["organisation"].append((organisation_id, rnd.choice(types), name[:256], address_id))
+        rows["phone"].extend(
+            (f"+7{rnd.randint(10**9, 10**10 - 1)}", organisation_id) for _ in range(rnd.randint(0, scale.max_phones))
+        )
+        rows["organisation_activity"].extend(
+            (organisation_id, activity_id)
+            for activity_id in rnd.sample(activity_ids, min(len(activity_ids), rnd.randint(0, scale.max_activities)))
+        )
+    return rows
+
+
+async def _connect(dsn: str) -> asyncpg.Connection:
+    connection = await asyncpg.connect(dsn)
+    await connection.execute("SET session_replication_role = replica")
+    return connection
+
+
+async def _copy(connection: asyncpg.Connection, table: str, records: list[tuple] | Iterator[tuple]) -> None:
+    await connection.copy_records_to_table(table, records=records, columns=COLUMNS[table])
+
+
+async def _copy_chunk(dsn: str, scale: FakeDataScale, offsets: IdOffsets, chunk: Chunk, activity_ids: list[int]) -> int:
+    connection = await _connect(dsn)
+    try:
+        async with connection.transaction():
+            if chunk.kind == "building":
+                await _copy(connection, "building", _building_rows(scale, offsets, chunk))
+                return chunk.count
+
+            rows = _organisation_rows(scale, offsets, chunk, activity_ids)
+            for table, records in rows.items():
+                await _copy(connection, table, records)
+            return sum(len(records) for records in rows.values())
+    finally:
+        await connection.close()
+
+
+def copy_chunk(dsn: str, scale: FakeDataScale, offsets: IdOffsets, chunk: Chunk, activity_ids: list[int]) -> int:
+    """Entry point of worker processes."""
+    return asyncio.run(_copy_chunk(dsn, scale, offsets, chunk, activity_ids))
+
+
+async def _id_offsets(connection: asyncpg.Connection) -> IdOffsets:
+    values = {}
+    for table in SERIAL_TABLES:
+        values[table] = await connection.fetchval(f"SELECT coalesce(max(id), 0) FROM {table}")
+    return IdOffsets(**values)
+
+
+async def _drop_secondary_indexes(connection: asyncpg.Connection) -> list[str]:
+    rows = await connection.fetch(
+        """
+        SELECT i.indexrelid::regclass::text AS name, pg_get_indexdef(i.indexrelid) AS definition
+        FROM pg_index i JOIN pg_class t ON t.oid = i.indrelid
+        WHERE t.relname = ANY($1::text[]) AND NOT i.indisprimary AND NOT i.indisunique
+        """,
+        [*TABLES, *DERIVED_TABLES],
+    )
+    async with connection.transaction():
+        for row in rows:
+            await connection.execute(f"DROP INDEX {row['name']}")
+    definitions = [row["definition"] for row in rows]
+    # recreated when the load ends, even a failed one, logged for a load that is killed
+    logger.info("Dropped %s indexes: %s", len(definitions), "; ".join(definitions))
+    return definitions
+
+
+async def _create_indexes(dsn: str, definitions: list[str], workers: int) -> None:
+    semaphore = asyncio.Semaphore(workers)
+
+    async def create(definition: str) -> None:
+        async with semaphore:
+            connection = await asyncpg.connect(dsn)
+            try:
+                await connection.execute(definition)
+            finally:
+                await connection.close()
+
+    await asyncio.gather(*(create(definition) for definition in definitions))
+
+
+def _chunks(kind: str, total: int, chunk_size: int, seed: int) -> list[Chunk]:
+    return [
+        Chunk(kind=kind, start=start, count=min(chunk_size, total - start), seed=seed + start)
+        for start in range(0, total, chunk_size)
+    ]
+
+
+async def load_fake_data(
+    scale: FakeDataScale | None = None, workers: int | None = None, rebuild_indexes: bool = True
+) -> None:
+    scale = scale or FakeDataScale.from_factor(1)
+    workers = workers or os.cpu_count() or 1
+    dsn = get_settings().PG.dsn
+    started = perf_counter()
+
+    connection = await _connect(dsn)
+    try:
+        offsets = await _id_offsets(connection)
+        index_definitions = await _drop_secondary_indexes(connection) if rebuild_indexes else []
+        try:
+            activities, closure, activity_ids = _activities(scale, offsets)
+            cities, streets = _geo_rows(scale, offsets)
+            async with connection.transaction():
+                await _copy(connection, "activity", activities)
+                await _copy(connection, "activity_closure", closure)
+                await _copy(connection, "city", cities)
+                await _copy(connection, "street", streets)
+
+            chunks = _chunks("building", scale.buildings, scale.chunk_size, seed=1_000_000_000)
+            chunks += _chunks("organisation", scale.organisations, scale.chunk_size, seed=2_000_000_000)
+            loop = asyncio.get_running_loop()
+            with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+                rows = await asyncio.gather(
+                    *(
+                        loop.run_in_executor(pool, copy_chunk, dsn, scale, offsets, chunk, activity_ids)
+                        for chunk in chunks
+                    )
+                )
+            loaded = perf_counter()
+            logger.info(
+                "Loaded %s rows in %.1fs",
+                sum(rows) + len(activities) + len(closure) + len(cities) + len(streets),
+                loaded - started,
             )
-            session.add(org_activity)
-    await session.commit()
 
+            await connection.execute("SELECT rebuild_organisation_search()")
+        finally:
+            # a failed load must not leave the database without its secondary indexes
+            await _create_indexes(dsn, index_definitions, workers)
 
-async def load_fake_data() -> None:
-    get_session_ctx = asynccontextmanager(get_session)
-    async with get_session_ctx() as session:
-        activities = await load_activities(session=session)
-        buildings = await load_buildings(session=session)
-        await load_organisations(session=session, activities=activities, buildings=buildings)
+        for table in SERIAL_TABLES:
+            await connection.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+            )
+        await connection.execute(f"ANALYZE {', '.join((*TABLES, *DERIVED_TABLES))}")
+        # replica mode kept every trigger off, including the activity notify and the organisation_search
+        # version bumps: do their work by hand, so running services reload the activity tree and their
+        # caches and clients do not get 304 for list pages that changed
+        async with connection.transaction():
+            await connection.execute("UPDATE organisation_search_version SET value = value + 1")
+            await connection.execute("SELECT pg_notify($1, '*')", ACTIVITY_CHANNEL)
+            await connection.execute("SELECT pg_notify($1, '*')", ORGANISATION_CHANNEL)
+        logger.info("Rebuilt %s indexes in %.1fs", len(index_definitions), perf_counter() - loaded)
+    finally:
+        await connection.close()
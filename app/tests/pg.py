@@ -0,0 +1,28 @@
+from pathlib import Path
+
+import asyncpg
+import pytest
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+
+from app.settings import get_settings
+
+ALEMBIC_INI = Path(__file__).parents[1] / "alembic.ini"
+
+
+async def connect_migrated() -> asyncpg.Connection:
+    """Connection to the database from ``PG_*``, which must be migrated to the latest revision.
+
+    Skips the test when the database cannot be reached.
+    """
+    try:
+        connection = await asyncpg.connect(get_settings().PG.dsn, timeout=5)
+    except (OSError, TimeoutError, asyncpg.PostgresError) as error:
+        pytest.skip(f"database is not available: {error}")
+
+    revision = await connection.fetchval("SELECT version_num FROM alembic_version")
+    head = ScriptDirectory.from_config(Config(ALEMBIC_INI)).get_current_head()
+    if revision != head:
+        await connection.close()
+        pytest.fail(f"database is at revision {revision}, run alembic upgrade head ({head})")
+    return connection
@@ -0,0 +1,50 @@
+import asyncio
+
+from app.service.activities import ActivityTree
+
+
+def test_descendants_at_any_depth() -> None:
+    tree = ActivityTree()
+    tree.build([(1, None), (2, 1), (3, 2), (4, 3), (5, None)])
+
+    assert set(tree.descendants(1)) == {1, 2, 3, 4}
+    assert set(tree.descendants(3)) == {3, 4}
+    assert tree.descendants(5) == (5,)
+
+
+def test_cycle_is_unreachable() -> None:
+    tree = ActivityTree()
+    tree.build([(1, None), (2, 3), (3, 2)])
+
+    assert tree.descendants(1) == (1,)
+    assert tree.descendants(2) == (2,)
+
+
+def test_known() -> None:
+    tree = ActivityTree()
+    # nothing is ruled out before the first load
+    assert tree.known(42)
+
+    tree.build([(1, None), (2, 1)])
+    assert tree.known(2)
+    assert not tree.known(42)
+
+
+def test_bulk_organisation_change_reloads() -> None:
+    tree = ActivityTree()
+    reloads = []
+
+    async def reload() -> None:
+        reloads.append(True)
+        tree.build([(1, None)])
+
+    tree.reload = reload
+
+    async def scenario() -> None:
+        tree.on_organisation_change("organisation:1")
+        tree.on_organisation_change("*")
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert reloads == [True]
+    assert tree.known(1)
@@ -0,0 +1,132 @@
+import asyncio
+from collections.abc import Callable
+from random import Random
+
+from starlette.types import Receive, Scope, Send
+
+from app.admission import AdaptiveLimiter, AdmissionMiddleware, Lane
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_limiter(initial_limit: int = 450) -> tuple[AdaptiveLimiter, FakeClock]:
+    clock = FakeClock()
+    limiter = AdaptiveLimiter(initial_limit=initial_limit, min_limit=10, max_limit=450, max_queue=10, clock=clock)
+    return limiter, clock
+
+
+def drive(
+    limiter: AdaptiveLimiter, clock: FakeClock, clients: int, latency: Callable[[int], float], seconds: float
+) -> None:
+    """Closed loop of ``clients`` clients, as many in flight as the limit lets through."""
+    end = clock.now + seconds
+    while clock.now < end:
+        in_flight = min(clients, int(limiter.limit))
+        sample = latency(in_flight)
+        limiter.in_flight = in_flight
+        limiter.release(sample)
+        clock.now += sample / in_flight
+
+
+def test_fast_responses_do_not_shrink_the_limit() -> None:
+    rnd = Random(1)
+
+    def mixed(_: int) -> float:
+        # cache hits and 304s next to ordinary queries
+        return 0.0005 if rnd.random() < 0.5 else rnd.uniform(0.01, 0.02)
+
+    limiter, clock = make_limiter()
+    drive(limiter, clock, clients=40, latency=mixed, seconds=300)
+    assert limiter.limit == 450
+
+
+def test_jitter_does_not_shrink_the_limit() -> None:
+    rnd = Random(2)
+    limiter, clock = make_limiter(initial_limit=10)
+    drive(limiter, clock, clients=40, latency=lambda _: rnd.uniform(0.002, 0.012), seconds=300)
+    # grown past the demand, nothing waits on the limiter
+    assert limiter.limit > 40
+
+
+def test_overload_shrinks_and_recovery_restores_the_limit() -> None:
+    rnd = Random(3)
+
+    # slow queries keep the number of simulated responses per window small
+    def steady(_: int) -> float:
+        return rnd.uniform(0.8, 1.2)
+
+    def saturated(in_flight: int) -> float:
+        # the database serves 100 queries at a time, the rest queue behind them
+        return max(1.0, in_flight / 100) * rnd.uniform(0.8, 1.2)
+
+    limiter, clock = make_limiter()
+    drive(limiter, clock, clients=1000, latency=steady, seconds=900)
+    assert limiter.limit == 450
+
+    drive(limiter, clock, clients=1000, latency=saturated, seconds=30)
+    assert limiter.limit < 300
+
+    drive(limiter, clock, clients=1000, latency=steady, seconds=60)
+    assert limiter.limit == 450
+
+
+def test_unused_limit_is_left_alone() -> None:
+    limiter, clock = make_limiter(initial_limit=100)
+    drive(limiter, clock, clients=10, latency=lambda _: 0.01, seconds=60)
+    drive(limiter, clock, clients=10, latency=lambda _: 0.5, seconds=60)
+    assert limiter.limit == 100
+
+
+def test_waiters_are_served_by_lane_and_shed_after_the_deadline() -> None:
+    async def scenario() -> None:
+        limiter, _ = make_limiter(initial_limit=10)
+        for _ in range(10):
+            assert await limiter.acquire(Lane.NORMAL, max_wait=0)
+
+        normal = asyncio.create_task(limiter.acquire(Lane.NORMAL, max_wait=1))
+        priority = asyncio.create_task(limiter.acquire(Lane.PRIORITY, max_wait=1))
+        await asyncio.sleep(0)
+        limiter.release(latency=None)
+        assert await priority
+        assert not normal.done()
+
+        assert not await limiter.acquire(Lane.PRIORITY, max_wait=0.01)
+        limiter.release(latency=None)
+        assert await normal
+        assert limiter.in_flight == 10
+        assert limiter.queued == 0
+
+    asyncio.run(scenario())
+
+
+def test_error_responses_do_not_feed_the_latency() -> None:
+    async def forbidden(scope: Scope, receive: Receive, send: Send) -> None:  # noqa: ARG001
+        await send({"type": "http.response.start", "status": 403, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def scenario() -> AdaptiveLimiter:
+        limiter, _ = make_limiter()
+        limiter.window_samples = 1
+        middleware = AdmissionMiddleware(
+            forbidden, limiter=limiter, bypass="^/ping/", priority="^$", queue_timeout=1, retry_after=1
+        )
+
+        async def send(_: dict) -> None:
+            pass
+
+        async def receive() -> dict:
+            return {"type": "http.request"}
+
+        for _ in range(100):
+            await middleware({"type": "http", "path": "/", "method": "GET", "headers": []}, receive, send)
+        return limiter
+
+    limiter = asyncio.run(scenario())
+    assert limiter.in_flight == 0
+    assert limiter.latency == 0
@@ -0,0 +1,76 @@
+import asyncio
+
+from app.admission import AdaptiveLimiter
+from app.request_stats import RequestStats, request_stats
+from app.service.cache import SingleFlight, TaggedLRUCache
+
+
+def test_burst_of_scheduled_clears_clears_once() -> None:
+    async def scenario() -> TaggedLRUCache[int]:
+        cache: TaggedLRUCache[int] = TaggedLRUCache(maxsize=10, ttl=60)
+        cache.set("count", 1, tags=())
+        for _ in range(1000):
+            cache.schedule_clear(0.01)
+        # still served until the delay is over
+        assert cache.get("count") == 1
+
+        await asyncio.sleep(0.05)
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert cache.get("count") is None
+    assert cache.generation == 1
+
+
+def test_shared_work_keeps_a_slot_after_its_callers_are_gone() -> None:
+    async def scenario() -> list[int]:
+        limiter = AdaptiveLimiter(initial_limit=10, min_limit=1, max_limit=10, max_queue=10)
+        single_flight: SingleFlight[int] = SingleFlight(limiter=limiter)
+        release = asyncio.Event()
+
+        async def work() -> int:
+            await release.wait()
+            return 1
+
+        in_flight = []
+        callers = [asyncio.create_task(single_flight.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        in_flight.append(limiter.in_flight)
+
+        release.set()
+        await asyncio.sleep(0.01)
+        in_flight.append(limiter.in_flight)
+        return in_flight
+
+    assert asyncio.run(scenario()) == [1, 0]
+
+
+def test_shared_work_stats_go_to_every_caller() -> None:
+    async def scenario() -> tuple[RequestStats, RequestStats]:
+        single_flight: SingleFlight[int] = SingleFlight()
+        release = asyncio.Event()
+
+        async def work() -> int:
+            await release.wait()
+            # what the engine hooks do for every statement
+            request_stats.get().statements += 1
+            return 1
+
+        async def caller() -> RequestStats:
+            stats = RequestStats()
+            request_stats.set(stats)
+            await single_flight.do("key", work)
+            return stats
+
+        callers = [asyncio.create_task(caller()) for _ in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+        first, second = await asyncio.gather(*callers)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first.statements == 1
+    assert second.statements == 1
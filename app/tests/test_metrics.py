@@ -0,0 +1,20 @@
+from app.metrics import Counter, Histogram, MetricsRegistry
+
+
+def test_registry_labels_every_sample() -> None:
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("requests_total", "Requests", labels=("status",)))
+    histogram = registry.register(Histogram("latency_seconds", "Latency", buckets=(0.1,)))
+    counter.inc(("200",))
+    histogram.observe(0.05)
+
+    registry.set_labels(worker="1")
+    samples = [line for line in registry.render().splitlines() if not line.startswith("#")]
+
+    assert samples == [
+        'requests_total{status="200",worker="1"} 1',
+        'latency_seconds_bucket{worker="1",le="0.1"} 1',
+        'latency_seconds_bucket{worker="1",le="+Inf"} 1',
+        'latency_seconds_sum{worker="1"} 0.05',
+        'latency_seconds_count{worker="1"} 1',
+    ]
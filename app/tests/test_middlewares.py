@@ -0,0 +1,76 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from app.admission import get_request_limiter
+from app.auth import get_write_keys
+from app.middlewares import setup_middlewares
+from app.settings import get_settings
+
+DETAIL = f"/api/{get_settings().API_VERSION}/organisations/1/"
+INGEST = f"/api/{get_settings().API_VERSION}/organisations/ingest/"
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get(DETAIL)
+    async def detail() -> dict:
+        return {"id": 1}
+
+    @app.post(INGEST)
+    async def ingest() -> dict:
+        return {"rows": 0}
+
+    return setup_middlewares(app)
+
+
+async def request(method: str, headers: dict[str, str], path: str = DETAIL) -> httpx.Response:
+    transport = httpx.ASGITransport(app=make_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.request(method, path, headers=headers)
+
+
+def test_requests_without_a_key_do_not_wait_for_the_limiter() -> None:
+    limiter = get_request_limiter()
+    in_flight, limiter.in_flight = limiter.in_flight, int(limiter.limit)
+    try:
+        response = asyncio.run(request("GET", {"Origin": "http://example.com"}))
+    finally:
+        limiter.in_flight = in_flight
+
+    assert response.status_code == 403
+    assert response.headers["access-control-allow-origin"] == "*"
+
+
+def test_preflight_requests_need_no_key() -> None:
+    headers = {"Origin": "http://example.com", "Access-Control-Request-Method": "GET"}
+    response = asyncio.run(request("OPTIONS", headers))
+
+    assert response.status_code == 200
+    assert "GET" in response.headers["access-control-allow-methods"]
+
+
+def test_requests_with_a_key_are_admitted() -> None:
+    response = asyncio.run(request("GET", {"X-AUTH-KEY": get_settings().API_AUTH_KEY}))
+
+    assert response.status_code == 200
+    assert response.json() == {"id": 1}
+
+
+def test_ingestion_takes_only_write_keys() -> None:
+    settings = get_settings()
+    write_keys, settings.API_WRITE_KEYS = settings.API_WRITE_KEYS, ["write-key"]
+    get_write_keys.cache_clear()
+    try:
+        read = asyncio.run(request("POST", {"X-AUTH-KEY": settings.API_AUTH_KEY}, INGEST))
+        write = asyncio.run(request("POST", {"X-AUTH-KEY": "write-key"}, INGEST))
+        write_on_read = asyncio.run(request("GET", {"X-AUTH-KEY": "write-key"}))
+    finally:
+        settings.API_WRITE_KEYS = write_keys
+        get_write_keys.cache_clear()
+
+    assert read.status_code == 403
+    assert write.status_code == 200
+    assert write_on_read.status_code == 403
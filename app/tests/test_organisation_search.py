@@ -0,0 +1,24 @@
+import asyncio
+
+from tests.pg import connect_migrated
+
+
+async def differences() -> tuple[int, int]:
+    connection = await connect_migrated()
+    try:
+        only_source = await connection.fetchval(
+            "SELECT count(*) FROM"
+            " (SELECT * FROM organisation_search_source EXCEPT ALL SELECT * FROM organisation_search_bulk_source) d"
+        )
+        only_bulk = await connection.fetchval(
+            "SELECT count(*) FROM"
+            " (SELECT * FROM organisation_search_bulk_source EXCEPT ALL SELECT * FROM organisation_search_source) d"
+        )
+    finally:
+        await connection.close()
+    return only_source, only_bulk
+
+
+def test_refresh_and_rebuild_build_the_same_rows() -> None:
+    # refresh_organisation_search() reads the first view, rebuild_organisation_search() the second one
+    assert asyncio.run(differences()) == (0, 0)
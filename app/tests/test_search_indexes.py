@@ -0,0 +1,17 @@
+import asyncio
+
+from tests.benchmark import explain_search
+from tests.pg import connect_migrated
+
+
+async def explain() -> dict[str, dict]:
+    connection = await connect_migrated()
+    try:
+        return await explain_search(connection, "cafe")
+    finally:
+        await connection.close()
+
+
+def test_name_search_uses_its_indexes() -> None:
+    for check, result in asyncio.run(explain()).items():
+        assert result["ok"], f"{check}: {result['index']} is not used, plan has {result['used']}"